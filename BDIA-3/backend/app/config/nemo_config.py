@@ -10,14 +10,26 @@ class NeMoConfig(BaseSettings):
     # Model settings
     NEMO_MODEL_PATH: str = os.getenv("NEMO_MODEL_PATH", "nvidia/nemo-multimodal-large")
     NEMO_CACHE_DIR: str = os.getenv("NEMO_CACHE_DIR", "./cache")
+    # Bump to invalidate stored visual features after changing model weights
+    MODEL_VERSION: str = os.getenv("NEMO_MODEL_VERSION", "1")
     MAX_INPUT_LENGTH: int = int(os.getenv("NEMO_MAX_INPUT_LENGTH", "1024"))
     MAX_OUTPUT_LENGTH: int = int(os.getenv("NEMO_MAX_OUTPUT_LENGTH", "512"))
-    BATCH_SIZE: int = int(os.getenv("NEMO_BATCH_SIZE", "1"))
+    BATCH_SIZE: int = int(os.getenv("NEMO_BATCH_SIZE", "16"))
+    MAX_BATCH_WAIT_MS: float = float(os.getenv("NEMO_MAX_BATCH_WAIT_MS", "10"))
     TEMPERATURE: float = float(os.getenv("NEMO_TEMPERATURE", "0.7"))
     TOP_K: int = int(os.getenv("NEMO_TOP_K", "50"))
     TOP_P: float = float(os.getenv("NEMO_TOP_P", "0.9"))
     USE_GPU: bool = os.getenv("NEMO_USE_GPU", "false").lower() == "true"
 
+    # PDF rasterization
+    PDF_DPI: int = int(os.getenv("NEMO_PDF_DPI", "150"))
+    PDF_MAX_PAGES: int = int(os.getenv("NEMO_PDF_MAX_PAGES", "0"))  # 0 means every page
+    PDF_PAGE_WINDOW: int = int(os.getenv("NEMO_PDF_PAGE_WINDOW", "4"))  # Pages per rasterization task
+    PDF_WORKERS: int = int(os.getenv("NEMO_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # Per-page visual features shared across requests and workers (empty disables it)
+    VISUAL_FEATURE_STORE_PATH: str = os.getenv("NEMO_VISUAL_FEATURE_STORE_PATH", "./data/visual_features.sqlite3")
+
     class Config:
         env_prefix = "NEMO_"
         env_file = ".env"
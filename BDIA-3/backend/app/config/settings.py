@@ -27,9 +27,40 @@ class Settings(BaseSettings):
     
     # NVIDIA
     NVIDIA_API_KEY: str = os.getenv("NVIDIA_API_KEY", "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")
+    LLM_BASE_URL: Optional[str] = os.getenv("LLM_BASE_URL")  # Overrides the NVIDIA endpoint, e.g. a mock server
     
     # Storage
     VECTOR_STORE_PATH: str = "./data/vector_store"
+
+    # Embedding batching
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+
+    # Embedding cache (in-process LRU entries, plus a SQLite file shared across workers)
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3")
+
+    # Deepest page number hybrid search serves without a cursor; each one re-runs the pages before it
+    SEARCH_MAX_PAGE: int = int(os.getenv("SEARCH_MAX_PAGE", "10"))
+
+    # Neighbours kept per research note in the similar-notes graph
+    NOTE_GRAPH_NEIGHBORS: int = int(os.getenv("NOTE_GRAPH_NEIGHBORS", "10"))
+
+    # Loaded document indices kept in memory, bounded by their size on disk
+    INDEX_CACHE_MAX_BYTES: int = int(os.getenv("INDEX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+    # Multimodal RAG page nodes: pages are rendered a window at a time and kept as thumbnails
+    RAG_PDF_DPI: int = int(os.getenv("RAG_PDF_DPI", "150"))
+    RAG_PAGE_WINDOW: int = int(os.getenv("RAG_PAGE_WINDOW", "8"))
+    RAG_PDF_WORKERS: int = int(os.getenv("RAG_PDF_WORKERS", "2"))
+    RAG_THUMBNAIL_SIZE: int = int(os.getenv("RAG_THUMBNAIL_SIZE", "512"))  # Longest side, in pixels
+
+    # Map-reduce summarization
+    SUMMARY_CHUNK_SIZE: int = int(os.getenv("SUMMARY_CHUNK_SIZE", "4000"))  # Characters per map call
+    SUMMARY_MAX_CONCURRENCY: int = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8"))
+    SUMMARY_CONTEXT_CHARS: int = int(os.getenv("SUMMARY_CONTEXT_CHARS", "12000"))  # Largest reduce prompt
+    # Chunk and document summaries keyed by content hash (empty disables it)
+    SUMMARY_STORE_PATH: str = os.getenv("SUMMARY_STORE_PATH", "./data/summaries.sqlite3")
     
     # Server Configuration
     HOST: str = os.getenv("HOST", "0.0.0.0")
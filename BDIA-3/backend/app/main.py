@@ -7,6 +7,9 @@ from app.services.nemo_service import NeMoMultimodalService
 from app.services.report_generation_service import ReportService
 from app.services.validation_service import ValidationService
 from app.services.vector_store_service import VectorStoreService
+from app.services.embedding_batcher import embedding_batcher_metrics
+from app.services.visual_feature_store import get_visual_feature_store
+from app.services.index_cache import get_index_cache
 
 # Initialize FastAPI app
 app = FastAPI(title="Document Explorer API")
@@ -48,6 +51,16 @@ app.state.validation_service = validation_service
 app.state.vector_store = vector_store
 app.state.multimodal_rag_service = multimodal_rag_service
 
+@app.get("/metrics/embeddings")
+async def embedding_metrics():
+    """Batching and cache metrics for embeddings, visual features and document indices"""
+    feature_store = get_visual_feature_store()
+    return {
+        "batchers": embedding_batcher_metrics(),
+        "visual_features": feature_store.stats() if feature_store is not None else None,
+        "document_indices": get_index_cache().stats()
+    }
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(documents.router, prefix="/documents", tags=["Documents"])
@@ -28,14 +28,16 @@ class SearchRequest(BaseModel):
     query: str
     document_id: Optional[str] = None
     search_type: SearchType = SearchType.BOTH
-    page: int = 1
+    page: int = 1  # Deprecated: costs a search per earlier page and stops at SEARCH_MAX_PAGE; use cursor
     page_size: int = 10
+    cursor: Optional[str] = None  # next_cursor from the previous page; takes precedence over page
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
-    total_results: int
+    total_results: Optional[int] = None  # Deprecated: no longer computed, always None
     page: int
-    total_pages: int
+    total_pages: Optional[int] = None  # Deprecated: no longer computed, always None
     query: str
     search_type: SearchType
-    document_id: Optional[str] = None
\ No newline at end of file
+    document_id: Optional[str] = None
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -25,16 +25,17 @@ async def generate_document_summary(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
 
-        # Generate summary
+        # Generate summary; unchanged documents come back from the summary store
         summary_result = await summarization_service.generate_document_summary(
             pdf_path=document.pdf_link
         )
 
-        # Store summary in database
-        await snowflake_service.update_document_summary(
-            document_id=document_id,
-            summary=summary_result["summary"]
-        )
+        # Store summary in database unless it is the one already stored
+        if not summary_result["metadata"].get("cached"):
+            await snowflake_service.update_document_summary(
+                document_id=document_id,
+                summary=summary_result["summary"]
+            )
 
         return {
             "document_id": document_id,
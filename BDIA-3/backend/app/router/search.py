@@ -25,8 +25,11 @@ async def hybrid_search(
             document_id=request.document_id,
             search_type=request.search_type,
             page=request.page,
-            page_size=request.page_size
+            page_size=request.page_size,
+            cursor=request.cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -34,6 +37,7 @@ async def hybrid_search(
 async def find_similar_notes(
     note_id: str,
     limit: int = 5,
+    rerank: bool = False,
     current_user = Depends(AuthService.get_current_user),
     search_service: SearchService = Depends()
 ):
@@ -41,7 +45,8 @@ async def find_similar_notes(
     try:
         return await search_service.search_similar_notes(
             note_id=note_id,
-            limit=limit
+            limit=limit,
+            rerank=rerank
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -54,6 +59,7 @@ async def search_by_time_range(
     search_type: SearchType = SearchType.BOTH,
     page: int = 1,
     page_size: int = 10,
+    cursor: Optional[str] = None,
     current_user = Depends(AuthService.get_current_user),
     search_service: SearchService = Depends()
 ):
@@ -65,7 +71,10 @@ async def search_by_time_range(
             end_date=end_date,
             search_type=search_type,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor=cursor
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,91 @@
+from typing import Dict, Iterable, Iterator, List, Tuple
+import re
+
+# Whitespace-delimited words, the same unit chunk_size has always been measured in
+TOKEN_PATTERN = re.compile(r"\S+")
+
+
+def _iter_piece_tokens(pieces: Iterable[str]) -> Iterator[Tuple[str, List[Tuple[int, int]]]]:
+    """Each non-empty piece with the [start, end) offsets of the tokens that end in it.
+
+    A token running up to the end of a piece may go on in the next one
+    (a word split across pages), so it is held back until whitespace or the
+    end of the input closes it and is counted once.
+    """
+    offset = 0
+    carry = ""  # unfinished token at the end of the pieces so far
+    for piece in pieces:
+        if not piece:
+            continue
+        text = carry + piece
+        base = offset - len(carry)
+        spans = [(base + match.start(), base + match.end()) for match in TOKEN_PATTERN.finditer(text)]
+        offset += len(piece)
+        carry = ""
+        if spans and spans[-1][1] == offset:
+            carry = text[spans.pop()[0] - base:]
+        yield piece, spans
+    if carry:
+        yield "", [(offset - len(carry), offset)]
+
+
+def iter_chunks(
+    pieces: Iterable[str],
+    max_tokens: int = 500,
+    overlap_tokens: int = 50
+) -> Iterator[Dict]:
+    """Stream overlapping chunks out of an iterator of lines or pages.
+
+    Pieces are consumed one at a time and only the text of the chunk being
+    built is held in memory. Each chunk carries its token count and the
+    [start, end) character offsets into the concatenation of all pieces, so
+    pass lines with their line endings (e.g. iterate over a file object) if
+    the offsets should line up with the original text.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be between 0 and max_tokens - 1")
+
+    parts: List[str] = []  # text of the pending window, starting at parts_start
+    parts_start = 0
+    spans: List[Tuple[int, int]] = []  # token offsets in the pending window
+    fresh = 0  # tokens not yet emitted in any chunk
+    index = 0
+
+    for piece, piece_spans in _iter_piece_tokens(pieces):
+        parts.append(piece)
+        for span in piece_spans:
+            spans.append(span)
+            fresh += 1
+            if len(spans) < max_tokens:
+                continue
+
+            window = "".join(parts)
+            start, end = spans[0][0], spans[-1][1]
+            yield {
+                "index": index,
+                "content": window[start - parts_start:end - parts_start],
+                "size": len(spans),
+                "start": start,
+                "end": end
+            }
+            index += 1
+
+            # Keep the tail of this chunk as the head of the next one
+            spans = spans[len(spans) - overlap_tokens:] if overlap_tokens else []
+            fresh = 0
+            keep_from = spans[0][0] if spans else end
+            parts = [window[keep_from - parts_start:]]
+            parts_start = keep_from
+
+    if fresh:
+        window = "".join(parts)
+        start, end = spans[0][0], spans[-1][1]
+        yield {
+            "index": index,
+            "content": window[start - parts_start:end - parts_start],
+            "size": len(spans),
+            "start": start,
+            "end": end
+        }
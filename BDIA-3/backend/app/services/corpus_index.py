@@ -0,0 +1,859 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import os
+import shutil
+import threading
+import uuid
+import numpy as np
+
+try:
+    import faiss
+    FAISS_SUPPORT = True
+except ImportError:
+    FAISS_SUPPORT = False
+    print("Warning: faiss not installed. Corpus search will fall back to exact scans.")
+
+# Metadata columns that get a posting list so they can be used as search filters
+FILTER_COLUMNS = ("document_id", "type", "note_id")
+
+# Metadata column kept as a sorted numeric (epoch seconds) column for range filters
+TIME_COLUMN = "timestamp"
+
+# On-disk layout: <path>/manifest.json points at <path>/<segment>/ which holds
+# vectors.npy (raw float32), texts.bin and metadata.bin (one UTF-8 / JSON record
+# per row, located through texts.offsets.npy and metadata.offsets.npy), the
+# posting lists (postings.json lists each column's values, postings-<column>.npy
+# their concatenated rows, postings-<column>.offsets.npy where each list starts),
+# time_keys.npy / time_rows.npy (the time column, sorted) and, when faiss is
+# available, the serialised graph. Everything but postings.json is memory-mapped
+# on load, so workers opening the same segment share its pages.
+FORMAT_VERSION = 2
+# Format 1 kept text and metadata in one JSON file; it is still readable
+LEGACY_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts"
+METADATA_FILE = "metadata"
+POSTINGS_FILE = "postings.json"
+TIME_KEYS_FILE = "time_keys.npy"
+TIME_ROWS_FILE = "time_rows.npy"
+LEGACY_COLUMNS_FILE = "columns.json"
+GRAPH_FILE = "hnsw.faiss"
+
+
+class CorpusIndex:
+    """Single corpus-wide vector index with filterable metadata columns.
+
+    Embeddings live in one contiguous float32 matrix (L2-normalised, so inner
+    product is cosine similarity). An HNSW graph over that matrix answers
+    unfiltered queries; filtered queries resolve their candidate rows from the
+    posting lists and either scan them exactly or restrict the graph search.
+
+    Deletes only set a tombstone bit, so removing or replacing a row never
+    touches the other rows. compact() drops tombstoned rows and rebuilds the
+    graph; it does the heavy work outside the lock so it can run in a
+    background thread while searches continue.
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        ef_search: int = 64,
+        exact_scan_threshold: int = 4096,
+        compaction_ratio: float = 0.2,
+        compaction_min_rows: int = 64
+    ):
+        self.dim = dim
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        # Below this many candidate rows a brute-force scan beats the graph
+        self.exact_scan_threshold = exact_scan_threshold
+        # Compact once this share of rows (and at least this many) are tombstones
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_rows = compaction_min_rows
+
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._reset_storage(dim)
+
+    def _reset_storage(self, dim: Optional[int]):
+        self._vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._tombstones = 0
+        self.texts = _RowColumn(_encode_text, _decode_text)
+        self.metadata = _RowColumn(_encode_json, _decode_json)
+        self._postings: Dict[str, _Postings] = {
+            column: _Postings() for column in FILTER_COLUMNS
+        }
+        self._time = _TimeColumn()
+        self._ann = None
+        self._ann_mapped = False
+
+    def __len__(self) -> int:
+        """Number of live (not tombstoned) rows"""
+        return self._size - self._tombstones
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """View of the populated part of the embedding matrix"""
+        return self._vectors[:self._size]
+
+    @property
+    def needs_compaction(self) -> bool:
+        return (
+            self._tombstones >= self.compaction_min_rows
+            and self._tombstones >= self.compaction_ratio * self._size
+        )
+
+    def document_ids(self) -> List[str]:
+        """Documents that have at least one live row in the index"""
+        with self._lock:
+            postings = self._postings["document_id"]
+            return [
+                document_id for document_id in postings.values()
+                if not self._deleted[postings.get(document_id)].all()
+            ]
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            rows = self._postings["document_id"].get(document_id)
+            return bool(len(rows)) and not self._deleted[rows].all()
+
+    def vectors_where(self, where: Dict[str, str], key_column: str) -> List[Tuple[Optional[str], np.ndarray]]:
+        """(metadata[key_column], embedding) for every live row matching `where`.
+
+        Embeddings are copied under the lock, so they stay valid while a
+        concurrent compact() renumbers or replaces the storage.
+        """
+        with self._lock:
+            rows = self._live_rows(self._candidate_rows(where))
+            return [
+                (self.metadata[row].get(key_column), np.array(self._vectors[row]))
+                for row in rows
+            ]
+
+    def fetch(
+        self,
+        column: str,
+        values: Iterable[str],
+        query_embedding: Optional[Sequence] = None
+    ) -> List[Dict]:
+        """Results for the newest live row of each value of a filter column.
+
+        Values without a live row are skipped; the rest keep the given order.
+        With query_embedding, each score is the row's similarity to it,
+        otherwise scores are None.
+        """
+        query = None if query_embedding is None else self._as_matrix(query_embedding)[0]
+        with self._lock:
+            results = []
+            for value in values:
+                rows = self._live_rows(self._candidate_rows({column: value}))
+                if len(rows):
+                    row = int(rows[-1])
+                    score = None if query is None else float(self._vectors[row] @ query)
+                    results.append(self._result(row, score))
+            return results
+
+    def add(
+        self,
+        embeddings: Sequence,
+        texts: Sequence[str],
+        metadatas: Sequence[Dict]
+    ) -> List[int]:
+        """Append rows to the index and return their row ids"""
+        if not len(texts):
+            return []
+        vectors = self._as_matrix(embeddings)
+        if len(vectors) != len(texts) or len(texts) != len(metadatas):
+            raise ValueError("embeddings, texts and metadatas must have the same length")
+
+        with self._lock:
+            self._generation += 1
+            return self._append(vectors, texts, metadatas)
+
+    def delete(self, where: Dict[str, str]) -> int:
+        """Tombstone every live row matching the filter and return how many were hit"""
+        if not where:
+            raise ValueError("delete() needs at least one filter")
+        with self._lock:
+            rows = self._live_rows(self._candidate_rows(where))
+            if len(rows):
+                self._generation += 1
+                self._deleted[rows] = True
+                self._tombstones += len(rows)
+            return len(rows)
+
+    def upsert(
+        self,
+        key_column: str,
+        embedding: Sequence,
+        text: str,
+        metadata: Dict
+    ) -> int:
+        """Replace the live row(s) sharing metadata[key_column] with a single new row"""
+        vectors = self._as_matrix(embedding)
+        with self._lock:
+            self.delete({key_column: metadata[key_column]})
+            self._generation += 1
+            return self._append(vectors, [text], [metadata])[0]
+
+    def compact(self) -> bool:
+        """Drop tombstoned rows and rebuild the graph.
+
+        Returns False without changing anything when the index was modified
+        while the replacement was being built; the caller can simply retry.
+        """
+        with self._lock:
+            if not self._tombstones:
+                return True
+            generation = self._generation
+            live = np.flatnonzero(~self._deleted[:self._size])
+            vectors = self._vectors[live]
+            texts = [self.texts[row] for row in live]
+            metadatas = [self.metadata[row] for row in live]
+
+        compacted = self._empty_like()
+        if len(live):
+            compacted._append(vectors, texts, metadatas)
+
+        with self._lock:
+            if self._generation != generation:
+                return False
+            self._vectors = compacted._vectors
+            self._deleted = compacted._deleted
+            self._size = compacted._size
+            self._tombstones = 0
+            self.texts = compacted.texts
+            self.metadata = compacted.metadata
+            self._postings = compacted._postings
+            self._time = compacted._time
+            self._ann = compacted._ann
+            self._ann_mapped = False
+            self._generation += 1
+            return True
+
+    def save(self, path: str):
+        """Write the live rows as a new segment and atomically switch the manifest to it"""
+        with self._lock:
+            if self._tombstones:
+                snapshot = None
+                live = np.flatnonzero(~self._deleted[:self._size])
+                vectors = self._vectors[live]
+                texts = [self.texts[row] for row in live]
+                metadatas = [self.metadata[row] for row in live]
+            else:
+                snapshot = self
+        if snapshot is None:
+            # Never persist tombstones: write a compacted copy instead
+            snapshot = self._empty_like()
+            if len(live):
+                snapshot._append(vectors, texts, metadatas)
+
+        root = Path(path)
+        root.mkdir(parents=True, exist_ok=True)
+        segment = f"segment-{uuid.uuid4().hex}"
+        segment_dir = root / segment
+        segment_dir.mkdir()
+
+        with snapshot._lock:
+            np.save(segment_dir / VECTORS_FILE, np.ascontiguousarray(snapshot.vectors))
+            rows = range(snapshot._size)
+            _write_records(segment_dir, TEXTS_FILE, (snapshot.texts.encoded(row) for row in rows))
+            _write_records(segment_dir, METADATA_FILE, (snapshot.metadata.encoded(row) for row in rows))
+            posting_values = {}
+            for column, postings in snapshot._postings.items():
+                values = postings.values()
+                lists = [postings.get(value) for value in values]
+                np.save(
+                    segment_dir / f"postings-{column}.npy",
+                    np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+                )
+                np.save(
+                    segment_dir / f"postings-{column}.offsets.npy",
+                    np.cumsum([0] + [len(rows) for rows in lists], dtype=np.int64)
+                )
+                posting_values[column] = values
+            with open(segment_dir / POSTINGS_FILE, "w", encoding="utf-8") as f:
+                json.dump(posting_values, f)
+            time_keys, time_rows = snapshot._time.arrays()
+            np.save(segment_dir / TIME_KEYS_FILE, time_keys)
+            np.save(segment_dir / TIME_ROWS_FILE, time_rows)
+            if snapshot._ann is not None:
+                faiss.write_index(snapshot._ann, str(segment_dir / GRAPH_FILE))
+            manifest = {
+                "format_version": FORMAT_VERSION,
+                "dim": snapshot.dim,
+                "rows": snapshot._size,
+                "segments": [segment],
+                "params": {
+                    "hnsw_m": self.hnsw_m,
+                    "ef_construction": self.ef_construction,
+                    "ef_search": self.ef_search,
+                    "exact_scan_threshold": self.exact_scan_threshold
+                }
+            }
+
+        tmp_manifest = root / f"{MANIFEST_FILE}.tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, root / MANIFEST_FILE)
+
+        # Readers that still map an old segment keep their pages until they reload
+        for stale in root.glob("segment-*"):
+            if stale.name != segment:
+                shutil.rmtree(stale, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusIndex":
+        """Open a saved index without reading it into memory.
+
+        The first segment is used in place: vectors, texts, metadata, posting
+        lists and the time column stay memory-mapped and are only decoded row by
+        row when read, so loading costs the same at any size and workers share
+        the pages. Further segments, and format 1 segments, are read and
+        appended; the next save() writes them back in the mapped format.
+        """
+        root = Path(path)
+        with open(root / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        format_version = manifest.get("format_version")
+        if format_version not in (FORMAT_VERSION, LEGACY_FORMAT_VERSION):
+            raise ValueError(f"Unsupported corpus index format: {format_version}")
+
+        index = cls(dim=manifest["dim"], **manifest["params"])
+        for segment in manifest["segments"]:
+            segment_dir = root / segment
+            vectors = np.load(segment_dir / VECTORS_FILE, mmap_mode="r")
+            if index._size == 0:
+                index._use_segment(segment_dir, vectors, format_version)
+            else:
+                texts, metadatas = _read_segment_rows(segment_dir, format_version)
+                index._append(np.asarray(vectors), texts, metadatas)
+        return index
+
+    def _use_segment(self, segment_dir: Path, vectors: np.ndarray, format_version: int):
+        """Adopt a saved segment, graph included, as the index contents; no copy until the index is written to"""
+        self._vectors = vectors
+        self._deleted = np.zeros(len(vectors), dtype=bool)
+        self._size = len(vectors)
+        if format_version == FORMAT_VERSION:
+            self._map_columns(segment_dir)
+        else:
+            texts, metadatas = _read_segment_rows(segment_dir, format_version)
+            for row, (text, meta) in enumerate(zip(texts, metadatas)):
+                self.texts.append(text)
+                self.metadata.append(meta)
+                self._index_row(row, meta)
+
+        graph_path = segment_dir / GRAPH_FILE
+        if FAISS_SUPPORT and graph_path.exists():
+            self._ann, self._ann_mapped = _read_graph(graph_path)
+        elif FAISS_SUPPORT:
+            self.rebuild_ann()
+
+    def _map_columns(self, segment_dir: Path):
+        self.texts = _RowColumn(_encode_text, _decode_text, *_map_records(segment_dir, TEXTS_FILE))
+        self.metadata = _RowColumn(_encode_json, _decode_json, *_map_records(segment_dir, METADATA_FILE))
+        with open(segment_dir / POSTINGS_FILE, encoding="utf-8") as f:
+            posting_values = json.load(f)
+        self._postings = {
+            column: _Postings(
+                posting_values[column],
+                _load_mapped(segment_dir / f"postings-{column}.npy"),
+                _load_mapped(segment_dir / f"postings-{column}.offsets.npy")
+            ) if column in posting_values else _Postings()
+            for column in FILTER_COLUMNS
+        }
+        self._time = _TimeColumn(
+            _load_mapped(segment_dir / TIME_KEYS_FILE),
+            _load_mapped(segment_dir / TIME_ROWS_FILE)
+        )
+
+    def _empty_like(self) -> "CorpusIndex":
+        return CorpusIndex(
+            dim=self.dim,
+            hnsw_m=self.hnsw_m,
+            ef_construction=self.ef_construction,
+            ef_search=self.ef_search,
+            exact_scan_threshold=self.exact_scan_threshold,
+            compaction_ratio=self.compaction_ratio,
+            compaction_min_rows=self.compaction_min_rows
+        )
+
+    def _append(
+        self,
+        vectors: np.ndarray,
+        texts: Sequence[str],
+        metadatas: Sequence[Dict]
+    ) -> List[int]:
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+
+        start = self._size
+        self._reserve(start + len(vectors))
+        self._vectors[start:start + len(vectors)] = vectors
+        self._deleted[start:start + len(vectors)] = False
+        self._size += len(vectors)
+
+        rows = list(range(start, self._size))
+        for row, text, meta in zip(rows, texts, metadatas):
+            self.texts.append(text)
+            meta = dict(meta)
+            meta.setdefault("node_id", uuid.uuid4().hex)
+            self.metadata.append(meta)
+            self._index_row(row, meta)
+
+        if FAISS_SUPPORT:
+            if self._ann_mapped:
+                # Copy-on-write: detach from the read-only mapped graph before growing it
+                self._ann = _detach_graph(self._ann)
+                self._ann_mapped = False
+            self._get_ann().add(vectors)
+        return rows
+
+    def search(
+        self,
+        query_embedding: Sequence,
+        top_k: int = 5,
+        where: Optional[Dict[str, str]] = None,
+        after: Optional[Tuple[float, str]] = None,
+        time_range: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None
+    ) -> List[Dict]:
+        """Return result dicts for the best live matches, best first.
+
+        Each hit is resolved to its node_id, text, metadata and score before
+        the lock is released, so a concurrent compact() cannot renumber rows
+        between the search and the lookup.
+
+        Results are ordered by (score descending, node_id ascending). Passing
+        the (score, node_id) of the last result seen as `after` returns the
+        next results in that order, which is what cursor pagination uses.
+
+        time_range is an inclusive (start, end) bound on the timestamp column;
+        either end may be None. It is resolved from the sorted time column
+        before the vector search, so it narrows the rows that get scored.
+        """
+        query = self._as_matrix(query_embedding)
+        with self._lock:
+            return [
+                self._result(row, score)
+                for row, score in self._search_hits(query, top_k, where, after, time_range)
+            ]
+
+    def _search_hits(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        where: Optional[Dict[str, str]],
+        after: Optional[Tuple[float, str]],
+        time_range: Optional[Tuple[Optional[datetime], Optional[datetime]]]
+    ) -> List[Tuple[int, float]]:
+        """(row, score) pairs behind search(); only valid while the lock is held"""
+        with self._lock:
+            if len(self) == 0 or top_k <= 0:
+                return []
+
+            candidates = self._candidate_rows(where)
+            if time_range is not None:
+                in_range = self._rows_in_time_range(*time_range)
+                candidates = in_range if candidates is None else np.intersect1d(
+                    candidates, in_range, assume_unique=True
+                )
+            if candidates is not None:
+                candidates = self._live_rows(candidates)
+                if len(candidates) == 0:
+                    return []
+            if after is None:
+                return self._ordered(self._search_rows(query, top_k, candidates))
+
+            # Everything ranked above the watermark is skipped, so widen the
+            # search until enough rows below it come back
+            available = len(self) if candidates is None else len(candidates)
+            k = 2 * top_k
+            while True:
+                hits = [
+                    hit for hit in self._ordered(
+                        self._search_rows(query, min(k, available), candidates)
+                    )
+                    if self._is_after(hit, after)
+                ]
+                if len(hits) >= top_k or k >= available:
+                    return hits[:top_k]
+                k *= 2
+
+    def _row_key(self, row: int) -> str:
+        """Stable id of a row, unaffected by compaction or reloads"""
+        return self.metadata[row]["node_id"]
+
+    def _result(self, row: int, score: Optional[float]) -> Dict:
+        """Result dict used by the search APIs; call with the lock held"""
+        metadata = self.metadata[row]
+        return {
+            "id": metadata.get("document_id"),
+            "node_id": metadata["node_id"],
+            "content": self.texts[row],
+            "score": score,
+            "metadata": metadata
+        }
+
+    def _search_rows(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        candidates: Optional[np.ndarray]
+    ) -> List[Tuple[int, float]]:
+        if candidates is None:
+            if self._ann is None or self._size <= self.exact_scan_threshold:
+                return self._exact_search(query, None, top_k)
+            return self._ann_search(query, top_k)
+        if self._ann is None or len(candidates) <= self.exact_scan_threshold:
+            return self._exact_search(query, candidates, top_k)
+        return self._ann_search(query, top_k, candidates)
+
+    def _ordered(self, hits: List[Tuple[int, float]]) -> List[Tuple[int, float]]:
+        return sorted(hits, key=lambda hit: (-hit[1], self._row_key(hit[0])))
+
+    def _is_after(self, hit: Tuple[int, float], after: Tuple[float, str]) -> bool:
+        score, key = after
+        return hit[1] < score or (hit[1] == score and self._row_key(hit[0]) > key)
+
+    def _rows_in_time_range(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime]
+    ) -> np.ndarray:
+        """Rows whose timestamp falls in [start, end], via binary search on the time column"""
+        return self._time.rows_between(
+            None if start is None else to_epoch(start),
+            None if end is None else to_epoch(end)
+        )
+
+    def _live_rows(self, rows: np.ndarray) -> np.ndarray:
+        return rows[~self._deleted[rows]] if self._tombstones else rows
+
+    def _candidate_rows(self, where: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """Intersect the posting lists of the requested filters"""
+        if not where:
+            return None
+        rows = None
+        for column, value in where.items():
+            if column not in self._postings:
+                raise ValueError(f"Column '{column}' is not filterable")
+            posting = self._postings[column].get(value)
+            rows = posting if rows is None else np.intersect1d(rows, posting, assume_unique=True)
+            if len(rows) == 0:
+                break
+        return rows
+
+    def _exact_search(
+        self,
+        query: np.ndarray,
+        rows: Optional[np.ndarray],
+        top_k: int
+    ) -> List[Tuple[int, float]]:
+        """Brute-force inner product over all rows or a candidate subset"""
+        if rows is None:
+            scores = self.vectors @ query[0]
+            if self._tombstones:
+                scores[self._deleted[:self._size]] = -np.inf
+            k = min(top_k, len(self))
+        else:
+            scores = self._vectors[rows] @ query[0]
+            k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        row_ids = best if rows is None else rows[best]
+        return [(int(row), float(scores[i])) for row, i in zip(row_ids, best)]
+
+    def _ann_search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Approximate search over the HNSW graph, optionally restricted to rows"""
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = max(self.ef_search, top_k)
+        if rows is not None:
+            selector = faiss.IDSelectorBatch(rows)
+            params.sel = selector
+        elif self._tombstones:
+            tombstoned = faiss.IDSelectorBatch(np.flatnonzero(self._deleted[:self._size]))
+            selector = faiss.IDSelectorNot(tombstoned)
+            params.sel = selector
+        scores, ids = self._ann.search(query, top_k, params=params)
+        return [(int(row), float(score)) for row, score in zip(ids[0], scores[0]) if row >= 0]
+
+    def _get_ann(self):
+        if self._ann is None:
+            self._ann = faiss.IndexHNSWFlat(self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self._ann.hnsw.efConstruction = self.ef_construction
+            self._ann.hnsw.efSearch = self.ef_search
+        return self._ann
+
+    def _index_row(self, row: int, meta: Dict):
+        for column in FILTER_COLUMNS:
+            value = meta.get(column)
+            if value is not None:
+                self._postings[column].add(value, row)
+
+        timestamp = meta.get(TIME_COLUMN)
+        if timestamp is not None:
+            self._time.add(to_epoch(timestamp), row)
+
+    def _reserve(self, capacity: int):
+        """Grow the embedding matrix geometrically so appends stay amortised O(1)"""
+        if capacity <= len(self._vectors) and self._vectors.flags.writeable:
+            return
+        new_capacity = max(capacity, 2 * len(self._vectors), 64)
+        grown = np.empty((new_capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+        deleted = np.zeros(new_capacity, dtype=bool)
+        deleted[:self._size] = self._deleted[:self._size]
+        self._deleted = deleted
+
+    @staticmethod
+    def _as_matrix(embeddings) -> np.ndarray:
+        matrix = np.array(embeddings, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms)
+
+    def rebuild_ann(self):
+        """Rebuild the HNSW graph from the embedding matrix"""
+        self._ann = None
+        if FAISS_SUPPORT and self._size:
+            self._get_ann().add(self.vectors)
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_vectors"] = self.vectors.copy()
+            state["_deleted"] = self._deleted[:self._size].copy()
+        state["_ann"] = None
+        state["_ann_mapped"] = False
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self.rebuild_ann()
+
+
+def to_epoch(value: Union[datetime, str, float]) -> float:
+    """Epoch seconds for a datetime or ISO string; naive values are taken as UTC"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _encode_text(text: str) -> bytes:
+    return text.encode("utf-8")
+
+
+def _decode_text(payload: bytes) -> str:
+    return payload.decode("utf-8")
+
+
+def _encode_json(value: Dict) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_json(payload: bytes) -> Dict:
+    return json.loads(payload)
+
+
+class _RowColumn:
+    """One value per row: a mapped segment's records, decoded on access, then rows appended in memory"""
+
+    def __init__(self, encode, decode, records: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self._encode = encode
+        self._decode = decode
+        self._records = records
+        self._offsets = offsets
+        self._mapped_rows = 0 if offsets is None else len(offsets) - 1
+        self._appended: List = []
+
+    def __len__(self) -> int:
+        return self._mapped_rows + len(self._appended)
+
+    def __getitem__(self, row: int):
+        if row < self._mapped_rows:
+            return self._decode(self.encoded(row))
+        return self._appended[row - self._mapped_rows]
+
+    def encoded(self, row: int) -> bytes:
+        if row < self._mapped_rows:
+            return self._records[int(self._offsets[row]):int(self._offsets[row + 1])].tobytes()
+        return self._encode(self._appended[row - self._mapped_rows])
+
+    def append(self, value):
+        self._appended.append(value)
+
+    def __getstate__(self):
+        # Pickles carry the values, not the mapping
+        state = self.__dict__.copy()
+        state.update(_records=None, _offsets=None, _mapped_rows=0, _appended=[self[row] for row in range(len(self))])
+        return state
+
+
+class _Postings:
+    """value -> rows for one filter column: a mapped segment's lists, then rows appended in memory"""
+
+    def __init__(self, values: Sequence = (), rows: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self._mapped = {value: position for position, value in enumerate(values)}
+        self._rows = rows
+        self._offsets = offsets
+        self._appended: Dict[str, List[int]] = {}
+
+    def get(self, value) -> np.ndarray:
+        """Rows for value in ascending order"""
+        position = self._mapped.get(value)
+        appended = self._appended.get(value)
+        parts = []
+        if position is not None:
+            parts.append(np.array(
+                self._rows[int(self._offsets[position]):int(self._offsets[position + 1])], dtype=np.int64
+            ))
+        if appended:
+            parts.append(np.asarray(appended, dtype=np.int64))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def add(self, value, row: int):
+        self._appended.setdefault(value, []).append(row)
+
+    def values(self) -> List:
+        return list(self._mapped) + [value for value in self._appended if value not in self._mapped]
+
+    def __getstate__(self):
+        values = self.values()
+        return {
+            "_mapped": {}, "_rows": None, "_offsets": None,
+            "_appended": {value: self.get(value).tolist() for value in values}
+        }
+
+
+class _TimeColumn:
+    """Rows ordered by epoch seconds: a mapped segment's sorted arrays, then rows appended in memory"""
+
+    def __init__(self, keys: Optional[np.ndarray] = None, rows: Optional[np.ndarray] = None):
+        self._mapped_keys = keys if keys is not None else np.empty(0, dtype=np.float64)
+        self._mapped_rows = rows if rows is not None else np.empty(0, dtype=np.int64)
+        # Parallel lists kept sorted by key
+        self._keys: List[float] = []
+        self._rows: List[int] = []
+
+    def add(self, key: float, row: int):
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._rows.insert(position, row)
+
+    def rows_between(self, start: Optional[float], end: Optional[float]) -> np.ndarray:
+        """Sorted rows whose key falls in [start, end]; None leaves that end open"""
+        lo = 0 if start is None else int(np.searchsorted(self._mapped_keys, start, side="left"))
+        hi = len(self._mapped_keys) if end is None else int(np.searchsorted(self._mapped_keys, end, side="right"))
+        appended_lo = 0 if start is None else bisect_left(self._keys, start)
+        appended_hi = len(self._keys) if end is None else bisect_right(self._keys, end)
+        return np.sort(np.concatenate([
+            np.array(self._mapped_rows[lo:hi], dtype=np.int64),
+            np.asarray(self._rows[appended_lo:appended_hi], dtype=np.int64)
+        ]))
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All (keys, rows), sorted by key"""
+        keys = np.concatenate([np.asarray(self._mapped_keys, dtype=np.float64), np.asarray(self._keys, dtype=np.float64)])
+        rows = np.concatenate([np.asarray(self._mapped_rows, dtype=np.int64), np.asarray(self._rows, dtype=np.int64)])
+        order = np.argsort(keys, kind="stable")
+        return keys[order], rows[order]
+
+    def __getstate__(self):
+        keys, rows = self.arrays()
+        return {"_mapped_keys": keys, "_mapped_rows": rows, "_keys": [], "_rows": []}
+
+
+def _write_records(segment_dir: Path, name: str, records: Iterable[bytes]):
+    """Concatenate records into <name>.bin, with their boundaries in <name>.offsets.npy"""
+    offsets = [0]
+    with open(segment_dir / f"{name}.bin", "wb") as f:
+        for record in records:
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(segment_dir / f"{name}.offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+
+def _map_records(segment_dir: Path, name: str) -> Tuple[np.ndarray, np.ndarray]:
+    records_path = segment_dir / f"{name}.bin"
+    records = (
+        np.memmap(records_path, dtype=np.uint8, mode="r")
+        if records_path.stat().st_size else np.empty(0, dtype=np.uint8)
+    )
+    return records, _load_mapped(segment_dir / f"{name}.offsets.npy")
+
+
+def _load_mapped(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # numpy cannot map an empty array
+        return np.load(path)
+
+
+def _read_segment_rows(segment_dir: Path, format_version: int) -> Tuple[List[str], List[Dict]]:
+    """Every text and metadata dict of a segment, for appending it to an index"""
+    if format_version == FORMAT_VERSION:
+        texts = _RowColumn(_encode_text, _decode_text, *_map_records(segment_dir, TEXTS_FILE))
+        metadata = _RowColumn(_encode_json, _decode_json, *_map_records(segment_dir, METADATA_FILE))
+        return [texts[row] for row in range(len(texts))], [metadata[row] for row in range(len(metadata))]
+
+    with open(segment_dir / LEGACY_COLUMNS_FILE, encoding="utf-8") as f:
+        sidecar = json.load(f)
+    columns = sidecar["columns"]
+    texts = columns["text"]
+    metadatas = [
+        {
+            key: value for key, value in zip(sidecar["keys"], values)
+            if value is not None
+        }
+        for values in zip(*(columns[key] for key in sidecar["keys"]))
+    ] if sidecar["keys"] else [{} for _ in texts]
+    return texts, metadatas
+
+
+def _read_graph(graph_path: Path):
+    """Read a serialised graph; returns (index, mapped).
+
+    IO_FLAG_MMAP leaves IndexHNSWFlat's vector storage in RAM, so only
+    IO_FLAG_MMAP_IFC (faiss >= 1.11) maps the graph; older faiss reads it.
+    """
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_flag is not None:
+        try:
+            return faiss.read_index(str(graph_path), mmap_flag | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError:
+            pass
+    return faiss.read_index(str(graph_path)), False
+
+
+def _detach_graph(index):
+    """Owned copy of a mapped graph; clone_index would keep viewing the file and cannot grow"""
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
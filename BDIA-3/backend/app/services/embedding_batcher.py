@@ -0,0 +1,190 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+import asyncio
+import time
+from .embedding_cache import EmbeddingCache, text_key, to_numpy
+
+# How many recent batches the latency/size percentiles are computed over
+METRICS_WINDOW = 1024
+
+
+class EmbeddingBatcher:
+    """Coalesce embedding requests from concurrent callers into fixed-size batches.
+
+    Callers await embed(); their texts are queued and a single worker task
+    drains the queue, sending at most batch_size texts per encoder call. A
+    batch is dispatched as soon as it is full or max_wait_ms after its first
+    text arrived, whichever comes first. The encoder runs in the default
+    executor so a slow model never blocks the event loop.
+
+    With a cache attached, texts already embedded under this batcher's name
+    are answered from the cache and never queued; fresh results are written
+    back. Embeddings are then always returned as float32 numpy arrays.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Sequence[Any]],
+        batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        name: str = "embeddings",
+        cache: Optional[EmbeddingCache] = None
+    ):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.encode = encode
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.cache = cache
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._batches = 0
+        self._texts = 0
+        self._errors = 0
+        self._batch_sizes: deque = deque(maxlen=METRICS_WINDOW)
+        self._encode_ms: deque = deque(maxlen=METRICS_WINDOW)
+        self._wait_ms: deque = deque(maxlen=METRICS_WINDOW)
+
+    async def embed(self, texts: Sequence[str]) -> List[Any]:
+        """Embed texts, sharing encoder calls with any other pending requests"""
+        if not texts:
+            return []
+        if self.cache is None:
+            return await self._submit(texts)
+
+        loop = asyncio.get_running_loop()
+        # The cache may read and write SQLite, so keep it off the event loop
+        results = await loop.run_in_executor(None, self.cache.get_many, self.name, texts)
+        # Texts that normalise to the same cache key are only encoded once
+        pending: Dict[str, str] = {}
+        for text, cached in zip(texts, results):
+            if cached is None:
+                pending.setdefault(text_key(text), text)
+        if pending:
+            missing = list(pending.values())
+            fresh = [to_numpy(embedding) for embedding in await self._submit(missing)]
+            await loop.run_in_executor(None, self.cache.put_many, self.name, missing, fresh)
+            by_key = dict(zip(pending, fresh))
+            results = [
+                cached if cached is not None else by_key[text_key(text)]
+                for text, cached in zip(texts, results)
+            ]
+        return results
+
+    async def _submit(self, texts: Sequence[str]) -> List[Any]:
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future, time.perf_counter()))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def embed_one(self, text: str) -> Any:
+        return (await self.embed([text]))[0]
+
+    def metrics(self) -> Dict:
+        """Batch-size and latency statistics over the recent window"""
+        return {
+            "name": self.name,
+            "batch_size_limit": self.batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self._batches,
+            "texts": self._texts,
+            "errors": self._errors,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "mean_batch_size": _mean(self._batch_sizes),
+            "encode_ms_p50": _percentile(self._encode_ms, 50),
+            "encode_ms_p95": _percentile(self._encode_ms, 95),
+            "queue_wait_ms_p50": _percentile(self._wait_ms, 50),
+            "queue_wait_ms_p95": _percentile(self._wait_ms, 95),
+            "cache": self.cache.stats() if self.cache is not None else None
+        }
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Queues are bound to a loop; start over if we are on a new one
+            if self._loop is not loop:
+                self._queue = asyncio.Queue()
+                self._loop = loop
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        started = time.perf_counter()
+        texts = [text for text, _, _ in batch]
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                None, self.encode, texts
+            )
+            embeddings = list(embeddings)
+            if len(embeddings) != len(texts):
+                raise ValueError(
+                    f"Encoder returned {len(embeddings)} embeddings for {len(texts)} texts"
+                )
+        except Exception as e:
+            self._errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        self._batches += 1
+        self._texts += len(batch)
+        self._batch_sizes.append(len(batch))
+        self._encode_ms.append((finished - started) * 1000.0)
+        for (_, future, enqueued), embedding in zip(batch, embeddings):
+            self._wait_ms.append((started - enqueued) * 1000.0)
+            if not future.done():
+                future.set_result(embedding)
+
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+
+
+def get_embedding_batcher(
+    name: str,
+    encode: Callable[[List[str]], Sequence[Any]],
+    batch_size: int = 32,
+    max_wait_ms: float = 10.0,
+    cache: Optional[EmbeddingCache] = None
+) -> EmbeddingBatcher:
+    """Process-wide batcher per model, so every service instance shares one queue"""
+    if name not in _batchers:
+        _batchers[name] = EmbeddingBatcher(encode, batch_size, max_wait_ms, name, cache)
+    return _batchers[name]
+
+
+def embedding_batcher_metrics() -> List[Dict]:
+    return [batcher.metrics() for batcher in _batchers.values()]
+
+
+def _mean(values) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def _percentile(values, percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
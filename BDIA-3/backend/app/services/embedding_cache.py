@@ -0,0 +1,155 @@
+from typing import Any, Dict, List, Optional, Sequence
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+from app.config.settings import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Bumped when the stored vector format changes; older rows are dropped and recomputed.
+# Version 1 stores float32, so a disk hit equals the vector it was computed as
+SCHEMA_VERSION = 1
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, collapsed whitespace, trimmed"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def to_numpy(embedding: Any) -> np.ndarray:
+    """Accept tensors, lists or arrays and return a flat float32 array"""
+    if hasattr(embedding, "detach"):
+        embedding = embedding.detach().cpu().numpy()
+    return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache keyed by (model id, sha256 of normalized text).
+
+    Lookups go to an in-process LRU first and then to a SQLite file that
+    stores vectors as float32, so restarts and other worker processes reuse
+    embeddings computed earlier and score exactly like fresh ones. Hits from
+    disk are promoted into the LRU. Methods block on SQLite; async callers
+    run them in an executor.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS embeddings")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, key))"
+            )
+            self._conn.commit()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached embeddings for texts, None where there is no entry"""
+        keys = [text_key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._memory.get((model, key))
+                if cached is not None:
+                    self._memory.move_to_end((model, key))
+                    results[i] = cached
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._conn is not None:
+                found = self._read_disk(model, list(missing))
+                for key, vector in found.items():
+                    self._remember((model, key), vector)
+                    for i in missing.pop(key):
+                        results[i] = vector
+                        self.hits += 1
+                        self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in missing.values())
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Any]):
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = text_key(text)
+                vector = to_numpy(embedding)
+                self._remember((model, key), vector)
+                rows.append((model, key, vector.tobytes()))
+            if self._conn is not None and rows:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text])[0]
+
+    def put(self, model: str, text: str, embedding: Any):
+        self.put_many(model, [text], [embedding])
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries_in_memory": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _read_disk(self, model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                [model, *batch]
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+        return found
+
+    def _remember(self, cache_key: tuple, vector: np.ndarray):
+        self._memory[cache_key] = vector
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache shared by every service"""
+    return EmbeddingCache(
+        path=settings.EMBEDDING_CACHE_PATH,
+        max_entries=settings.EMBEDDING_CACHE_SIZE
+    )
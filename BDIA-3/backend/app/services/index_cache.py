@@ -0,0 +1,108 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+import asyncio
+import os
+from app.config.settings import settings
+
+
+def path_signature(path: Path) -> Optional[Tuple[float, int]]:
+    """(latest mtime, total bytes) of a file or directory tree, None if it is missing"""
+    if not path.exists():
+        return None
+    if path.is_file():
+        stat = path.stat()
+        return stat.st_mtime, stat.st_size
+    mtime, size = path.stat().st_mtime, 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            mtime = max(mtime, stat.st_mtime)
+            size += stat.st_size
+    return mtime, size
+
+
+class IndexCache:
+    """LRU cache of loaded indices, bounded by their on-disk size in bytes.
+
+    Entries remember the mtime of the files they were loaded from and are
+    reloaded when those files change. Concurrent get() calls for the same
+    key share a single load instead of each deserializing the index.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._loading: Dict[Hashable, Tuple[float, asyncio.Future]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_loads = 0
+        self.evictions = 0
+
+    async def get(self, key: Hashable, path: Path, load: Callable[[], Any]) -> Optional[Any]:
+        """Cached value for key, loading it with load() in a worker thread when stale"""
+        signature = path_signature(path)
+        if signature is None:
+            self.invalidate(key)
+            return None
+        mtime, size = signature
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] == mtime:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        loading = self._loading.get(key)
+        if loading is not None and loading[0] == mtime:
+            self.shared_loads += 1
+            return await asyncio.shield(loading[1])
+
+        self.misses += 1
+        future = asyncio.ensure_future(asyncio.get_running_loop().run_in_executor(None, load))
+        self._loading[key] = (mtime, future)
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            if self._loading.get(key, (None, None))[1] is future:
+                del self._loading[key]
+        self.put(key, value, mtime, size)
+        return value
+
+    def put(self, key: Hashable, value: Any, mtime: float, size: int):
+        self.invalidate(key)
+        if size > self.max_bytes:
+            # Too big to ever fit; callers still get the value, it just is not kept
+            return
+        self._entries[key] = (value, mtime, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_loads": self.shared_loads,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+@lru_cache()
+def get_index_cache() -> IndexCache:
+    """Process-wide cache of loaded document indices"""
+    return IndexCache(max_bytes=settings.INDEX_CACHE_MAX_BYTES)
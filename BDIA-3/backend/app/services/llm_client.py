@@ -0,0 +1,13 @@
+from functools import lru_cache
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
+from app.config.settings import settings
+
+
+@lru_cache()
+def get_chat_model() -> ChatNVIDIA:
+    """Process-wide chat model, so every service shares one HTTP session and its pooled connections"""
+    kwargs = {"api_key": settings.NVIDIA_API_KEY}
+    if settings.LLM_BASE_URL:
+        # e.g. summarize/mock_llm_server.py for benchmarks
+        kwargs["base_url"] = settings.LLM_BASE_URL
+    return ChatNVIDIA(**kwargs)
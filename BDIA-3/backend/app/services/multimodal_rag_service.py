@@ -1,16 +1,18 @@
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Union
+import base64
+import io
 import torch
 from datetime import datetime
 from pathlib import Path
-import tempfile
 from PIL import Image
-from pdf2image import convert_from_path
 from llama_index import VectorStoreIndex, ServiceContext, Document as LlamaDocument
 from llama_index.multi_modal_llms import NvidiaMultiModalLLM
 from llama_index.multi_modal_llms.nvidia import NVIDIAMultiModalConfig
 from llama_index.schema import ImageNode, TextNode, NodeRelationship
 from  app.config.settings import Settings
 from ..models.document import Document
+from .index_cache import get_index_cache, path_signature
+from . import pdf_pages
 
 class MultiModalRAGService:
     def __init__(self):
@@ -24,10 +26,26 @@ class MultiModalRAGService:
             llm=self.llm,
             embed_model="local:BAAI/bge-large-en-v1.5"
         )
+        # Shared by every instance so hot documents are deserialized once per process
+        self.index_cache = get_index_cache()
         
-    async def _create_nodes(self, document: Document) -> List[Union[TextNode, ImageNode]]:
-        """Create nodes from document content"""
+    def _thumbnail(self, image: Image.Image) -> str:
+        """Downscale a page and return it base64-encoded, the form ImageNode stores"""
+        thumbnail = image.convert("RGB")
+        size = self.settings.RAG_THUMBNAIL_SIZE
+        thumbnail.thumbnail((size, size))
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format="JPEG", quality=85)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    async def _create_nodes(self, document: Document) -> AsyncIterator[List[Union[TextNode, ImageNode]]]:
+        """Yield nodes from document content, one page window at a time.
+
+        Full-resolution pages only live until their thumbnail is made, so
+        peak memory is bounded by RAG_PAGE_WINDOW pages, not the page count.
+        """
         nodes = []
+        text_node = None
         
         # Process text content
         if document.summary:
@@ -43,19 +61,19 @@ class MultiModalRAGService:
         # Process image
         if document.image_link:
             try:
-                image = Image.open(document.image_link)
-                image_node = ImageNode(
-                    image=image,
-                    metadata={
-                        "document_id": document.id,
-                        "type": "cover_image",
-                        "page_number": 1
-                    }
-                )
+                with Image.open(document.image_link) as image:
+                    image_node = ImageNode(
+                        image=self._thumbnail(image),
+                        metadata={
+                            "document_id": document.id,
+                            "type": "cover_image",
+                            "page_number": 1
+                        }
+                    )
                 nodes.append(image_node)
                 
                 # Create relationship between text and image
-                if nodes:
+                if text_node is not None:
                     NodeRelationship.from_nodes(
                         parent=text_node,
                         child=image_node,
@@ -63,39 +81,48 @@ class MultiModalRAGService:
                     )
             except Exception as e:
                 print(f"Error processing image: {str(e)}")
+
+        if nodes:
+            yield nodes
                 
         # Process PDF
         if document.pdf_link:
             try:
-                # Convert PDF pages to images
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    images = convert_from_path(document.pdf_link)
-                    for idx, image in enumerate(images, 1):
-                        image_node = ImageNode(
-                            image=image,
-                            metadata={
-                                "document_id": document.id,
-                                "type": "pdf_page",
-                                "page_number": idx
-                            }
-                        )
-                        nodes.append(image_node)
+                window = max(1, self.settings.RAG_PAGE_WINDOW)
+                nodes = []
+                async for page_number, image in pdf_pages.iter_pdf_pages(
+                    document.pdf_link,
+                    list(range(1, pdf_pages.count_pages(document.pdf_link) + 1)),
+                    dpi=self.settings.RAG_PDF_DPI,
+                    window=window,
+                    workers=self.settings.RAG_PDF_WORKERS
+                ):
+                    nodes.append(ImageNode(
+                        image=self._thumbnail(image),
+                        metadata={
+                            "document_id": document.id,
+                            "type": "pdf_page",
+                            "page_number": page_number
+                        }
+                    ))
+                    if len(nodes) >= window:
+                        yield nodes
+                        nodes = []
+                if nodes:
+                    yield nodes
             except Exception as e:
                 print(f"Error processing PDF: {str(e)}")
-                
-        return nodes
 
     async def process_document(self, document: Document) -> Dict:
         """Process document content with multimodal RAG"""
         try:
-            # Create nodes from document content
-            nodes = await self._create_nodes(document)
-            
-            # Create vector store index
+            # Create vector store index and feed it one window of nodes at a time
             index = VectorStoreIndex(
-                nodes,
+                [],
                 service_context=self.service_context
             )
+            async for nodes in self._create_nodes(document):
+                index.insert_nodes(nodes)
             
             return {
                 "document_id": document.id,
@@ -144,18 +171,22 @@ class MultiModalRAGService:
         except Exception as e:
             raise Exception(f"Error querying document: {str(e)}")
 
+    def _index_path(self, document_id: str) -> Path:
+        return Path(self.settings.VECTOR_STORE_PATH) / f"{document_id}.index"
+
     async def get_document_index(self, document_id: str) -> Optional[VectorStoreIndex]:
         """Retrieve document index from storage"""
         try:
-            # Implementation depends on your storage solution
-            # This is a placeholder - implement based on your storage
-            index_path = Path(self.settings.VECTOR_STORE_PATH) / f"{document_id}.index"
-            if index_path.exists():
-                return VectorStoreIndex.load_from_disk(
+            # Served from memory unless the files on disk changed since they were loaded
+            index_path = self._index_path(document_id)
+            return await self.index_cache.get(
+                document_id,
+                index_path,
+                lambda: VectorStoreIndex.load_from_disk(
                     str(index_path),
                     service_context=self.service_context
                 )
-            return None
+            )
         except Exception as e:
             raise Exception(f"Error retrieving document index: {str(e)}")
 
@@ -163,8 +194,11 @@ class MultiModalRAGService:
         """Save document index to storage"""
         try:
             # Implementation depends on your storage solution
-            index_path = Path(self.settings.VECTOR_STORE_PATH) / f"{document_id}.index"
+            index_path = self._index_path(document_id)
             index_path.parent.mkdir(parents=True, exist_ok=True)
             index.save_to_disk(str(index_path))
+            # The saved index is already in memory; no need to read it back
+            mtime, size = path_signature(index_path)
+            self.index_cache.put(document_id, index, mtime, size)
         except Exception as e:
             raise Exception(f"Error saving document index: {str(e)}")
\ No newline at end of file
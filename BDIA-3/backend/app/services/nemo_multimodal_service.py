@@ -1,21 +1,16 @@
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
 import torch
 import numpy as np
 from PIL import Image
 import nemo.collections.nlp as nemo_nlp
 import nemo.collections.multimodal as nemo_multimodal
 from ..config.nemo_config import nemo_config
+from .embedding_batcher import get_embedding_batcher
+from .embedding_cache import get_embedding_cache
+from .visual_feature_store import file_hash, get_visual_feature_store
+from . import pdf_pages
 from pathlib import Path
-import tempfile
-import os
-import platform
-
-try:
-    from pdf2image import convert_from_path
-    PDF_SUPPORT = True
-except ImportError:
-    PDF_SUPPORT = False
-    print("Warning: pdf2image not installed. PDF processing will be limited.")
 
 class NeMoMultimodalService:
     def __init__(self):
@@ -31,56 +26,210 @@ class NeMoMultimodalService:
             print(f"Warning: Could not load NeMo model: {str(e)}")
             self.multimodal_model = None
 
-    def _convert_pdf_to_images(self, pdf_path: str) -> List[Image.Image]:
-        """Convert PDF to images with proper Poppler configuration"""
-        try:
-            if platform.system() == "Windows":
-                poppler_path = os.getenv('POPPLER_PATH', r"C:\Program Files\poppler-23.11.0\Library\bin")
-                return convert_from_path(pdf_path, poppler_path=poppler_path)
-            else:
-                return convert_from_path(pdf_path)
-        except Exception as e:
-            raise Exception(f"Error converting PDF: {str(e)}")
+        self.text_batcher = get_embedding_batcher(
+            f"nemo:{self.config.NEMO_MODEL_PATH}",
+            self._encode_text_batch,
+            batch_size=self.config.BATCH_SIZE,
+            max_wait_ms=self.config.MAX_BATCH_WAIT_MS,
+            cache=get_embedding_cache()
+        )
+
+        # Image features are keyed by file content, page and model version
+        self.feature_store = get_visual_feature_store()
+        self.visual_model_version = f"{self.config.NEMO_MODEL_PATH}@{self.config.MODEL_VERSION}"
+
+    def _encode_text_batch(self, texts: List[str]) -> List[torch.Tensor]:
+        """Encode a batch of texts in one model call and split it back into rows"""
+        with torch.no_grad():
+            embeddings = self.multimodal_model.encode_text(texts)
+        return list(embeddings)
+
+    async def get_embedding(self, text: str) -> torch.Tensor:
+        """Text embedding, served from the shared embedding cache when possible"""
+        embedding = await self.text_batcher.embed_one(text)
+        return torch.from_numpy(embedding).to(self.device)
+
+    async def process_query(self, query: str) -> torch.Tensor:
+        """Embed a search query"""
+        return await self.get_embedding(query)
+
+    def _analyze_images(self, images: List[Image.Image]) -> List[Dict]:
+        """Encode a batch of images in one model call and analyze each of them"""
+        with torch.no_grad():
+            tensors = [
+                self.multimodal_model.preprocess_image(image).to(self.device)
+                for image in images
+            ]
+            embeddings = self.multimodal_model.encode_image(torch.stack(tensors))
+            return [
+                {
+                    "type": "image",
+                    "analysis": self.multimodal_model.analyze_image(tensor),
+                    "embedding": embedding
+                }
+                for tensor, embedding in zip(tensors, embeddings)
+            ]
+
+    def _cached_element(self, feature: Dict, page: Optional[int] = None) -> Dict:
+        element = {
+            "type": "image",
+            "analysis": feature["analysis"],
+            "embedding": torch.from_numpy(feature["embedding"]).to(self.device)
+        }
+        if page is not None:
+            element["page"] = page
+        return element
+
+    @staticmethod
+    def _load_image(image_path: str) -> Image.Image:
+        with Image.open(image_path) as image:
+            return image.convert("RGB")
 
     async def process_image(self, image_path: str) -> Dict:
         """Process and analyze image content"""
         try:
-            image = Image.open(image_path)
-            image_tensor = self.multimodal_model.preprocess_image(image).to(self.device)
-            
-            analysis = self.multimodal_model.analyze_image(image_tensor)
-            
-            return {
-                "type": "image",
-                "analysis": analysis,
-                "embedding": self.multimodal_model.encode_image(image_tensor)
-            }
+            # Hashing, the feature store and the model all block, so they run in the executor
+            loop = asyncio.get_running_loop()
+            if self.feature_store is not None:
+                content_hash = await loop.run_in_executor(None, file_hash, image_path)
+                cached = await loop.run_in_executor(
+                    None, self.feature_store.get_pages, content_hash, self.visual_model_version, [0]
+                )
+                if 0 in cached:
+                    return self._cached_element(cached[0])
+
+            image = await loop.run_in_executor(None, self._load_image, image_path)
+            element = (await loop.run_in_executor(None, self._analyze_images, [image]))[0]
+
+            if self.feature_store is not None:
+                await loop.run_in_executor(
+                    None, self.feature_store.put_pages, content_hash, self.visual_model_version, {0: element}
+                )
+            return element
         except Exception as e:
             raise Exception(f"Error processing image: {str(e)}")
 
-    async def process_pdf(self, pdf_path: str) -> List[Dict]:
+    def _resolve_pages(self, pdf_path: str, max_pages: Optional[int]) -> List[int]:
+        max_pages = self.config.PDF_MAX_PAGES if max_pages is None else max_pages
+        page_count = pdf_pages.count_pages(pdf_path)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+        return list(range(1, page_count + 1))
+
+    async def iter_pdf_pages(
+        self,
+        pdf_path: str,
+        dpi: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        pages: Optional[List[int]] = None
+    ) -> AsyncIterator[Tuple[int, Image.Image]]:
+        """Yield (page number, image) in page order, rasterizing windows in worker processes.
+
+        At most PDF_WORKERS windows of PDF_PAGE_WINDOW pages are rendered
+        ahead of the consumer, so memory does not grow with the page count.
+        Pass `pages` to render only those page numbers.
+        """
+        if pages is None:
+            pages = await asyncio.get_running_loop().run_in_executor(
+                None, self._resolve_pages, pdf_path, max_pages
+            )
+        async for page, image in pdf_pages.iter_pdf_pages(
+            pdf_path,
+            pages,
+            dpi=dpi or self.config.PDF_DPI,
+            window=self.config.PDF_PAGE_WINDOW,
+            workers=self.config.PDF_WORKERS
+        ):
+            yield page, image
+
+    async def iter_pdf_elements(
+        self,
+        pdf_path: str,
+        dpi: Optional[int] = None,
+        max_pages: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """Stream one visual element per page, encoding BATCH_SIZE pages per model call.
+
+        Pages already in the feature store are served from it; only the
+        missing ones are rasterized and encoded, and then stored.
+        """
+        dpi = dpi or self.config.PDF_DPI
+        loop = asyncio.get_running_loop()
+        pages = await loop.run_in_executor(None, self._resolve_pages, pdf_path, max_pages)
+        cached: Dict[int, Dict] = {}
+        if self.feature_store is not None:
+            content_hash = await loop.run_in_executor(None, file_hash, pdf_path)
+            # Rendering resolution changes the model input, so it is part of the key
+            model_version = f"{self.visual_model_version}:dpi{dpi}"
+            cached = await loop.run_in_executor(
+                None, self.feature_store.get_pages, content_hash, model_version, pages
+            )
+        missing = [page for page in pages if page not in cached]
+
+        batch: List[Tuple[int, Image.Image]] = []
+        cached_pages = iter(sorted(cached))
+        next_cached = next(cached_pages, None)
+
+        async def flush():
+            elements = await loop.run_in_executor(
+                None, self._analyze_images, [image for _, image in batch]
+            )
+            for (page, _), element in zip(batch, elements):
+                element["page"] = page
+            if self.feature_store is not None:
+                await loop.run_in_executor(
+                    None,
+                    self.feature_store.put_pages,
+                    content_hash,
+                    model_version,
+                    {element["page"]: element for element in elements}
+                )
+            batch.clear()
+            return elements
+
+        def cached_before(page: Optional[int]):
+            nonlocal next_cached
+            while next_cached is not None and (page is None or next_cached < page):
+                yield self._cached_element(cached[next_cached], next_cached)
+                next_cached = next(cached_pages, None)
+
+        if missing:
+            async for page, image in self.iter_pdf_pages(pdf_path, dpi, pages=missing):
+                batch.append((page, image))
+                if len(batch) >= self.config.BATCH_SIZE:
+                    for element in await flush():
+                        for hit in cached_before(element["page"]):
+                            yield hit
+                        yield element
+            if batch:
+                for element in await flush():
+                    for hit in cached_before(element["page"]):
+                        yield hit
+                    yield element
+        for hit in cached_before(None):
+            yield hit
+
+    async def process_pdf(
+        self,
+        pdf_path: str,
+        dpi: Optional[int] = None,
+        max_pages: Optional[int] = None
+    ) -> List[Dict]:
         """Process PDF and extract visual elements"""
         try:
-            images = self._convert_pdf_to_images(pdf_path)
-            visual_elements = []
-            
-            for idx, image in enumerate(images):
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                    image.save(tmp.name)
-                    element = await self.process_image(tmp.name)
-                    element["page"] = idx + 1
-                    visual_elements.append(element)
-                    os.unlink(tmp.name)
-                    
-            return visual_elements
+            return [
+                element async for element in self.iter_pdf_elements(pdf_path, dpi, max_pages)
+            ]
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
 
     async def query_document(self, query: str, document_content: str, visual_content: Optional[Dict] = None) -> Dict:
         """Query document using multimodal RAG"""
         try:
-            query_embedding = self.multimodal_model.encode_text(query)
-            doc_embedding = self.multimodal_model.encode_text(document_content)
+            query_embedding, doc_embedding = [
+                torch.from_numpy(embedding).to(self.device)
+                for embedding in await self.text_batcher.embed([query, document_content])
+            ]
             
             if visual_content:
                 visual_embedding = self.multimodal_model.encode_image(visual_content['image'])
@@ -104,7 +253,7 @@ class NeMoMultimodalService:
     async def generate_visual_summary(self, document: Dict) -> Dict:
         """Generate summary incorporating visual elements"""
         try:
-            text_embedding = self.multimodal_model.encode_text(document.get("content", ""))
+            text_embedding = await self.get_embedding(document.get("content", ""))
             
             visual_content = None
             if document.get("image_link"):
@@ -142,7 +291,7 @@ class NeMoMultimodalService:
     async def generate_multimodal_embedding(self, text: str, visual_content: Optional[Dict] = None) -> torch.Tensor:
         """Generate combined embedding from text and visual content"""
         try:
-            text_embedding = self.multimodal_model.encode_text(text)
+            text_embedding = await self.get_embedding(text)
             
             if not visual_content:
                 return text_embedding
@@ -158,7 +307,10 @@ class NeMoMultimodalService:
     async def analyze_content_trend(self, contents: List[str]) -> Dict:
         """Analyze trends in content"""
         try:
-            embeddings = [self.multimodal_model.encode_text(content) for content in contents]
+            embeddings = [
+                torch.from_numpy(embedding).to(self.device)
+                for embedding in await self.text_batcher.embed(contents)
+            ]
             trend_analysis = self.multimodal_model.analyze_trends(embeddings)
             
             return {
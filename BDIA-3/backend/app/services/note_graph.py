@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import threading
+
+
+class NoteGraph:
+    """k-nearest-neighbour graph over research notes, keyed by note_id.
+
+    Each note keeps its k best neighbours as (score, note_id) pairs, best
+    first, plus a reverse map of the notes that point at it. Linking a note
+    replaces its outgoing edges and offers it to each of its neighbours'
+    lists, so edges stay roughly symmetric without a full rebuild. Unlinking
+    a note returns the notes that pointed at it so the caller can re-query
+    their neighbours from the index.
+    """
+
+    def __init__(self, k: int = 10):
+        if k <= 0:
+            raise ValueError("k must be positive")
+        self.k = k
+        self._neighbors: Dict[str, List[Tuple[float, str]]] = {}
+        self._reverse: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, note_id: str) -> bool:
+        return note_id in self._neighbors
+
+    def __len__(self) -> int:
+        return len(self._neighbors)
+
+    def neighbors(self, note_id: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(note_id, score) pairs for the closest notes, best first"""
+        with self._lock:
+            edges = self._neighbors.get(note_id, [])[:limit]
+            return [(neighbor, score) for score, neighbor in edges]
+
+    def link(self, note_id: str, candidates: Iterable[Tuple[str, float]]):
+        """Set a note's neighbours from (note_id, score) search hits"""
+        edges = sorted(
+            ((score, neighbor) for neighbor, score in candidates if neighbor != note_id),
+            key=lambda edge: (-edge[0], edge[1])
+        )[:self.k]
+        with self._lock:
+            self._drop_outgoing(note_id)
+            self._neighbors[note_id] = edges
+            for score, neighbor in edges:
+                self._reverse.setdefault(neighbor, set()).add(note_id)
+                self._offer(neighbor, note_id, score)
+
+    def unlink(self, note_id: str) -> Set[str]:
+        """Remove a note and return the notes that lost it as a neighbour"""
+        with self._lock:
+            self._drop_outgoing(note_id)
+            self._neighbors.pop(note_id, None)
+            affected = self._reverse.pop(note_id, set())
+            for source in affected:
+                self._neighbors[source] = [
+                    edge for edge in self._neighbors.get(source, []) if edge[1] != note_id
+                ]
+            return affected
+
+    def clear(self):
+        with self._lock:
+            self._neighbors.clear()
+            self._reverse.clear()
+
+    def _offer(self, note_id: str, candidate: str, score: float):
+        """Insert candidate into note_id's list if it beats the current worst edge"""
+        edges = self._neighbors.get(note_id)
+        if edges is None or any(neighbor == candidate for _, neighbor in edges):
+            return
+        if len(edges) >= self.k and (-edges[-1][0], edges[-1][1]) <= (-score, candidate):
+            return
+        edges.append((score, candidate))
+        edges.sort(key=lambda edge: (-edge[0], edge[1]))
+        self._reverse.setdefault(candidate, set()).add(note_id)
+        for _, evicted in edges[self.k:]:
+            self._reverse.get(evicted, set()).discard(note_id)
+        del edges[self.k:]
+
+    def _drop_outgoing(self, note_id: str):
+        for _, neighbor in self._neighbors.get(note_id, []):
+            sources = self._reverse.get(neighbor)
+            if sources is not None:
+                sources.discard(note_id)
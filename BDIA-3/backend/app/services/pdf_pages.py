@@ -0,0 +1,104 @@
+from typing import AsyncIterator, Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import asyncio
+import os
+import platform
+from PIL import Image
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    PDF_SUPPORT = True
+except ImportError:
+    PDF_SUPPORT = False
+    print("Warning: pdf2image not installed. PDF processing will be limited.")
+
+# One pool per worker count: RAG_PDF_WORKERS and NEMO_PDF_WORKERS may differ,
+# and each service gets the parallelism it was configured with
+_raster_pools: Dict[int, ProcessPoolExecutor] = {}
+
+
+def poppler_kwargs() -> Dict:
+    """Poppler location on Windows, where it is rarely on PATH"""
+    if platform.system() == "Windows":
+        return {"poppler_path": os.getenv('POPPLER_PATH', r"C:\Program Files\poppler-23.11.0\Library\bin")}
+    return {}
+
+
+def count_pages(pdf_path: str) -> int:
+    if not PDF_SUPPORT:
+        raise Exception("pdf2image is not installed")
+    try:
+        return int(pdfinfo_from_path(pdf_path, **poppler_kwargs())["Pages"])
+    except Exception as e:
+        raise Exception(f"Error reading PDF info: {str(e)}")
+
+
+def rasterize_pages(pdf_path: str, first_page: int, last_page: int, dpi: int) -> List[Image.Image]:
+    """Render pages [first_page, last_page] (1-based); runs in a worker process"""
+    return convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        **poppler_kwargs()
+    )
+
+
+def page_windows(pages: List[int], window: int) -> List[Tuple[int, int]]:
+    """Split sorted page numbers into contiguous (first, last) runs of at most `window` pages"""
+    windows = []
+    for page in pages:
+        if windows and page == windows[-1][1] + 1 and page - windows[-1][0] < window:
+            windows[-1] = (windows[-1][0], page)
+        else:
+            windows.append((page, page))
+    return windows
+
+
+def _get_raster_pool(workers: int) -> ProcessPoolExecutor:
+    workers = max(1, workers)
+    pool = _raster_pools.get(workers)
+    if pool is None:
+        pool = _raster_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return pool
+
+
+async def iter_pdf_pages(
+    pdf_path: str,
+    pages: List[int],
+    dpi: int,
+    window: int,
+    workers: int
+) -> AsyncIterator[Tuple[int, Image.Image]]:
+    """Yield (page number, image) in page order, rasterizing windows in worker processes.
+
+    At most `workers` windows of `window` pages are rendered ahead of the
+    consumer, so memory does not grow with the page count.
+    """
+    if not PDF_SUPPORT:
+        raise Exception("pdf2image is not installed")
+    loop = asyncio.get_running_loop()
+    pool = _get_raster_pool(workers)
+    windows = iter(page_windows(sorted(pages), max(1, window)))
+    in_flight = []
+
+    def submit_next():
+        bounds = next(windows, None)
+        if bounds is not None:
+            in_flight.append((bounds[0], loop.run_in_executor(
+                pool, partial(rasterize_pages, pdf_path, bounds[0], bounds[1], dpi)
+            )))
+
+    for _ in range(max(1, workers)):
+        submit_next()
+    try:
+        while in_flight:
+            start, pending = in_flight.pop(0)
+            images = await pending
+            submit_next()
+            for offset, image in enumerate(images):
+                yield start + offset, image
+    finally:
+        for _, pending in in_flight:
+            pending.cancel()
@@ -44,7 +44,8 @@ class ResearchNotesService:
             await self.vector_store.add_research_note(
                 document_id=document_id,
                 note=content,
-                timestamp=note.created_at
+                timestamp=note.created_at,
+                metadata={"note_id": note_id}
             )
             
             return note
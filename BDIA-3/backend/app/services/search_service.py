@@ -1,10 +1,28 @@
-from typing import List, Dict, Optional, Union
+from typing import Callable, List, Dict, Optional, Tuple, Union
 from datetime import datetime
+from itertools import islice
+import asyncio
+import base64
+import heapq
+import json
+from app.config.settings import settings
 from ..models.search import SearchType, SearchResult, SearchResponse, VisualReference
 from .vector_store_service import VectorStoreService
 from .nemo_multimodal_service import NeMoMultimodalService
 from .research_notes_service import ResearchNotesService
 
+def encode_cursor(score: float, node_id: str) -> str:
+    """Opaque pagination cursor carrying the (score, node_id) of the last result"""
+    payload = json.dumps({"s": score, "k": node_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(payload["s"]), str(payload["k"])
+    except Exception:
+        raise ValueError("Invalid search cursor")
+
 class SearchService:
     def __init__(
         self,
@@ -22,132 +40,171 @@ class SearchService:
         document_id: Optional[str] = None,
         search_type: SearchType = SearchType.BOTH,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
     ) -> SearchResponse:
         """
-        Perform hybrid search across documents and research notes
+        Perform hybrid search across documents and research notes.
+
+        Pages are cut with a (score, node_id) watermark: each source returns
+        its next page_size + 1 hits below the watermark and the sources are
+        k-way merged, so no page ever re-sorts earlier results. Pass the
+        returned next_cursor to get the following page.
+
+        `page` without a cursor is deprecated: page N re-runs the N - 1
+        pages before it, so it is refused past settings.SEARCH_MAX_PAGE.
+        total_results and total_pages are not computed and stay None.
+
+        start_date/end_date restrict the search to rows timestamped in that
+        range; the vector store applies the bound before scoring. Raises
+        ValueError for a bad cursor or page.
         """
+        watermark = decode_cursor(cursor) if cursor else None
+        if cursor is None and not 1 <= page <= settings.SEARCH_MAX_PAGE:
+            raise ValueError(
+                f"page must be between 1 and {settings.SEARCH_MAX_PAGE}; "
+                "follow next_cursor to read further"
+            )
         try:
-            results: List[SearchResult] = []
-            
-            # Process query with NeMo for semantic understanding
-            query_embedding = await self.nemo_service.process_query(query)
+            # Embed the query once and share it across sources
+            query_embedding = await self.vector_store.embed_query(query)
             
+            sources = []
             if search_type in [SearchType.DOCUMENT, SearchType.BOTH]:
-                # Search in documents
-                doc_results = await self.vector_store.search_document(
-                    document_id=document_id,
-                    query=query,
-                    query_embedding=query_embedding,
-                    top_k=page_size
-                )
-                
-                # Process document results
-                for r in doc_results:
-                    # Extract visual references from metadata
-                    visual_refs = []
-                    if r.metadata.get('visual_elements'):
-                        visual_refs = [
-                            VisualReference(
-                                type=v['type'],
-                                page=v['page'],
-                                caption=v.get('caption', '')
-                            )
-                            for v in r.metadata['visual_elements']
-                        ]
-                    
-                    results.append(
-                        SearchResult(
-                            document_id=document_id or r.metadata.get('document_id'),
-                            content=r.text,
-                            relevance_score=r.score,
-                            source_type="document",
-                            page_number=r.metadata.get("page_number"),
-                            visual_references=visual_refs,
-                            timestamp=r.metadata.get("timestamp", datetime.now())
-                        )
-                    )
-            
+                sources.append(("documents", self._document_result))
             if search_type in [SearchType.RESEARCH_NOTES, SearchType.BOTH]:
-                # Search in research notes
-                note_results = await self.vector_store.search_research_notes(
-                    document_id=document_id,
-                    query=query,
-                    query_embedding=query_embedding,
-                    top_k=page_size
-                )
-                
-                # Process research note results
-                for r in note_results:
-                    results.append(
-                        SearchResult(
-                            document_id=document_id or r.metadata.get('document_id'),
-                            content=r.text,
-                            relevance_score=r.score,
-                            source_type="research_note",
-                            page_number=None,
-                            visual_references=[],
-                            timestamp=r.metadata.get("timestamp", datetime.now()),
-                            verified=r.metadata.get("verified", False),
-                            validator=r.metadata.get("validator")
-                        )
+                sources.append(("notes", self._note_result))
+            
+            exhausted = False
+            if cursor is None:
+                # Page numbers without a cursor: walk the watermark forward page by page
+                for _ in range(page - 1):
+                    skipped, has_more = await self._merged_page(
+                        query, query_embedding, document_id, sources, page_size, watermark,
+                        (start_date, end_date)
                     )
+                    if not has_more:
+                        exhausted = True
+                        break
+                    watermark = (skipped[-1][1]["score"], skipped[-1][1]["node_id"])
             
-            # Sort results by relevance score
-            results.sort(key=lambda x: x.relevance_score, reverse=True)
+            page_hits, has_more = [], False
+            if not exhausted:
+                page_hits, has_more = await self._merged_page(
+                    query, query_embedding, document_id, sources, page_size, watermark,
+                    (start_date, end_date)
+                )
             
-            # Calculate pagination
-            total_results = len(results)
-            start_idx = (page - 1) * page_size
-            end_idx = min(start_idx + page_size, total_results)
-            paginated_results = results[start_idx:end_idx]
+            results = [convert(hit, document_id) for convert, hit in page_hits]
+            next_cursor = None
+            if has_more:
+                last = page_hits[-1][1]
+                next_cursor = encode_cursor(last["score"], last["node_id"])
             
             return SearchResponse(
-                results=paginated_results,
-                total_results=total_results,
+                results=results,
                 page=page,
-                total_pages=(total_results + page_size - 1) // page_size,
                 query=query,
                 search_type=search_type,
-                document_id=document_id
+                document_id=document_id,
+                next_cursor=next_cursor
             )
             
         except Exception as e:
             raise Exception(f"Error performing hybrid search: {str(e)}")
 
+    async def _merged_page(
+        self,
+        query: str,
+        query_embedding: List[float],
+        document_id: Optional[str],
+        sources: List[Tuple[str, Callable]],
+        page_size: int,
+        watermark: Optional[Tuple[float, str]],
+        time_range: Tuple[Optional[datetime], Optional[datetime]] = (None, None)
+    ) -> Tuple[List[Tuple[Callable, Dict]], bool]:
+        """Next page_size hits below the watermark across all sources, plus whether more remain"""
+        fetched = await asyncio.gather(*[
+            self.vector_store.search_document(
+                query=query,
+                document_id=document_id,
+                search_type=search_type,
+                top_k=page_size + 1,
+                query_embedding=query_embedding,
+                after=watermark,
+                start_date=time_range[0],
+                end_date=time_range[1]
+            )
+            for search_type, _ in sources
+        ])
+        
+        # Each source is already sorted, so a heap merge only touches page_size + 1 items
+        streams = [
+            [(convert, hit) for hit in response["results"]]
+            for (_, convert), response in zip(sources, fetched)
+        ]
+        merged = heapq.merge(
+            *streams,
+            key=lambda item: (-item[1]["score"], item[1]["node_id"])
+        )
+        page_hits = list(islice(merged, page_size + 1))
+        return page_hits[:page_size], len(page_hits) > page_size
+
+    @staticmethod
+    def _document_result(r: Dict, document_id: Optional[str]) -> SearchResult:
+        metadata = r["metadata"]
+        # Extract visual references from metadata
+        visual_refs = [
+            VisualReference(
+                type=v['type'],
+                page=v['page'],
+                caption=v.get('caption', '')
+            )
+            for v in metadata.get('visual_elements') or []
+        ]
+        return SearchResult(
+            document_id=document_id or metadata.get('document_id'),
+            content=r["content"],
+            relevance_score=r["score"],
+            source_type="document",
+            page_number=metadata.get("page_number"),
+            visual_references=visual_refs,
+            timestamp=metadata.get("timestamp", datetime.now())
+        )
+
+    @staticmethod
+    def _note_result(r: Dict, document_id: Optional[str]) -> SearchResult:
+        metadata = r["metadata"]
+        return SearchResult(
+            document_id=document_id or metadata.get('document_id'),
+            content=r["content"],
+            relevance_score=r["score"],
+            source_type="research_note",
+            page_number=None,
+            visual_references=[],
+            timestamp=metadata.get("timestamp", datetime.now()),
+            verified=metadata.get("verified", False),
+            validator=metadata.get("validator")
+        )
+
     async def search_similar_notes(
         self,
         note_id: str,
-        limit: int = 5
+        limit: int = 5,
+        rerank: bool = False
     ) -> List[SearchResult]:
         """Find similar research notes"""
         try:
-            # Get original note
-            note = await self.notes_service.get_note(note_id)
-            if not note:
-                raise Exception(f"Research note {note_id} not found")
-            
-            # Get note embedding
-            note_embedding = await self.nemo_service.get_embedding(note.content)
-            
-            # Search for similar notes
-            similar_notes = await self.vector_store.search_research_notes(
-                query_embedding=note_embedding,
-                exclude_ids=[note_id],
-                top_k=limit
+            # Neighbours are precomputed as notes change, so this is a lookup
+            similar_notes = self.vector_store.similar_notes(
+                note_id=note_id,
+                limit=limit,
+                rerank=rerank
             )
             
-            return [
-                SearchResult(
-                    document_id=r.metadata.get('document_id'),
-                    content=r.text,
-                    relevance_score=r.score,
-                    source_type="research_note",
-                    timestamp=r.metadata.get("timestamp", datetime.now()),
-                    verified=r.metadata.get("verified", False),
-                    validator=r.metadata.get("validator")
-                ) for r in similar_notes
-            ]
+            return [self._note_result(r, None) for r in similar_notes]
             
         except Exception as e:
             raise Exception(f"Error finding similar notes: {str(e)}")
@@ -159,37 +216,23 @@ class SearchService:
         end_date: datetime,
         search_type: SearchType = SearchType.BOTH,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        cursor: Optional[str] = None
     ) -> SearchResponse:
         """Search within a specific time range"""
         try:
-            # Perform base search
-            search_response = await self.hybrid_search(
+            # The range is pushed down into the index, so nothing is over-fetched
+            return await self.hybrid_search(
                 query=query,
                 search_type=search_type,
-                page=1,  # Get all results for filtering
-                page_size=1000
-            )
-            
-            # Filter by date range
-            filtered_results = [
-                r for r in search_response.results
-                if start_date <= r.timestamp <= end_date
-            ]
-            
-            # Paginate filtered results
-            total_results = len(filtered_results)
-            start_idx = (page - 1) * page_size
-            end_idx = min(start_idx + page_size, total_results)
-            
-            return SearchResponse(
-                results=filtered_results[start_idx:end_idx],
-                total_results=total_results,
                 page=page,
-                total_pages=(total_results + page_size - 1) // page_size,
-                query=query,
-                search_type=search_type
+                page_size=page_size,
+                cursor=cursor,
+                start_date=start_date,
+                end_date=end_date
             )
             
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error performing time range search: {str(e)}")
\ No newline at end of file
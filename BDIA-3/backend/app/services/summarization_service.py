@@ -1,50 +1,277 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
+import asyncio
+import hashlib
+import time
 from app.config.settings import Settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
+from .llm_client import get_chat_model
+from .summary_store import content_hash, get_summary_store
+
+try:
+    import fitz
+    PDF_TEXT_SUPPORT = True
+except ImportError:
+    PDF_TEXT_SUPPORT = False
+
+# Prompt for the final, user-facing summary
+SUMMARY_PROMPT = (
+    "Generate a comprehensive summary of this document, "
+    "including key findings, methodology, and conclusions. "
+    "Format the response with clear sections."
+)
+
+# Map step: condense one chunk without losing facts the final summary needs
+CHUNK_PROMPT = (
+    "Summarize this excerpt of a longer document. Keep key findings, "
+    "figures, methodology details and conclusions; omit boilerplate."
+)
+
+# Reduce step: merge partial summaries of consecutive parts of the document
+COMBINE_PROMPT = (
+    "Combine these partial summaries of consecutive parts of one document "
+    "into a single summary. Keep key findings, figures, methodology details "
+    "and conclusions, and remove repetition."
+)
+
+# Upper bound on reduce levels, in case combined summaries stop shrinking before they fit one prompt
+MAX_REDUCE_LEVELS = 8
+
+# Names the chunking rule below, so stored document summaries made with another one are not reused
+CHUNKING_SCHEME = "content-anchored-lines"
+
+def _anchor_value(line: str) -> int:
+    """Stable 64-bit hash of a line (hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "big")
+
+def _split_long_line(line: str, max_chars: int) -> List[str]:
+    """Cut a line into pieces of at most max_chars, at the last space where there is one; the pieces tile the line"""
+    pieces = []
+    while len(line) > max_chars:
+        cut = line.rfind(" ", 0, max_chars) + 1 or max_chars
+        pieces.append(line[:cut])
+        line = line[cut:]
+    pieces.append(line)
+    return pieces
 
 class SummarizationService:
     def __init__(self):
         self.settings = Settings()
-        # Initialize the NVIDIA AI model
-        self.model = ChatNVIDIA(
-            api_key=self.settings.NVIDIA_API_KEY,
+        # Shared NVIDIA AI model; its connection pool is reused by every instance
+        self.model = get_chat_model()
+
+        # Bounds the number of in-flight model calls per summary
+        self.max_concurrency = self.settings.SUMMARY_MAX_CONCURRENCY
+        # Partial summaries are merged until they fit in one prompt of this size
+        self.context_chars = self.settings.SUMMARY_CONTEXT_CHARS
+
+        # Stored summaries are only reused for the same model, prompts and chunking
+        self.summary_store = get_summary_store()
+        model_name = getattr(self.model, "model", None) or type(self.model).__name__
+        self.chunk_variant = self._variant(model_name, CHUNK_PROMPT)
+        self.document_variant = self._variant(
+            model_name, CHUNK_PROMPT, COMBINE_PROMPT, SUMMARY_PROMPT,
+            self.settings.SUMMARY_CHUNK_SIZE, self.context_chars, CHUNKING_SCHEME
+        )
+
+    @staticmethod
+    def _variant(*parts) -> str:
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+    def split_into_chunks(self, text: str) -> List[str]:
+        """Split text into chunks of whole lines whose boundaries are anchored to content.
+
+        Once a chunk holds half of SUMMARY_CHUNK_SIZE, a line ends it when
+        the line's hash marks it as an anchor (odds proportional to its
+        length, so anchors come about every quarter chunk); a line that would
+        overflow the chunk also starts a new one. Boundaries depend only on
+        nearby text, so an edit changes the chunks around it and the rest
+        line up with their stored summaries again from the next anchor on.
+        Lines longer than a chunk are cut at spaces, without overlap, so the
+        chunks are consecutive slices of the text; only chunks of nothing but
+        whitespace are left out.
+        """
+        max_chars = self.settings.SUMMARY_CHUNK_SIZE
+        min_chars = max_chars // 2
+        span = max(1, max_chars // 4)
+
+        chunks: List[str] = []
+        current: List[str] = []
+        size = 0
+        for line in text.splitlines(keepends=True):
+            for piece in _split_long_line(line, max_chars):
+                if current and size + len(piece) > max_chars:
+                    chunks.append("".join(current))
+                    current, size = [], 0
+                current.append(piece)
+                size += len(piece)
+                if size >= min_chars and _anchor_value(piece) % span < len(piece):
+                    chunks.append("".join(current))
+                    current, size = [], 0
+        if current:
+            chunks.append("".join(current))
+        return [chunk for chunk in chunks if chunk.strip()]
+
+    def extract_pdf_text(self, pdf_path: str) -> str:
+        """Text of every page of a PDF, joined in page order"""
+        if not PDF_TEXT_SUPPORT:
+            raise Exception("PyMuPDF is not installed")
+        with fitz.open(pdf_path) as pdf:
+            return "".join(page.get_text("text") for page in pdf)
+
+    async def _complete(self, prompt: str, stats: Dict) -> str:
+        """One model call, recording latency and token usage under the given stage"""
+        started = time.perf_counter()
+        message = await self.model.ainvoke(prompt)
+        usage = getattr(message, "usage_metadata", None) or {}
+        if not usage:
+            token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+            usage = {
+                "input_tokens": token_usage.get("prompt_tokens", 0),
+                "output_tokens": token_usage.get("completion_tokens", 0)
+            }
+        stats["calls"] += 1
+        stats["latency_ms"] += (time.perf_counter() - started) * 1000.0
+        stats["input_tokens"] += usage.get("input_tokens", 0) or 0
+        stats["output_tokens"] += usage.get("output_tokens", 0) or 0
+        return message.content
+
+    async def _fan_out(self, prompts: List[str], stats: Dict) -> List[str]:
+        """Run prompts concurrently, at most max_concurrency at a time, keeping order"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await self._complete(prompt, stats)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run(prompt) for prompt in prompts))
+        stats["wall_ms"] += (time.perf_counter() - started) * 1000.0
+        return list(results)
+
+    def _group_for_reduce(self, partials: List[str]) -> List[List[str]]:
+        """Pack consecutive partial summaries into groups that fit one prompt"""
+        groups: List[List[str]] = [[]]
+        size = 0
+        for partial in partials:
+            if groups[-1] and size + len(partial) > self.context_chars:
+                groups.append([])
+                size = 0
+            groups[-1].append(partial)
+            size += len(partial)
+        return groups
+
+    async def _map_chunks(self, chunks: List[str], stats: Dict) -> List[str]:
+        """Partial summary per chunk, reusing stored summaries of unchanged chunks"""
+        hashes = [content_hash(chunk) for chunk in chunks]
+        known = (
+            self.summary_store.get_chunk_summaries(hashes, self.chunk_variant)
+            if self.summary_store is not None else {}
         )
-        
-        # Initialize text splitter for long documents
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        missing = {
+            chunk_hash: chunk for chunk_hash, chunk in zip(hashes, chunks)
+            if chunk_hash not in known
+        }
+        stats["reused"] = len(chunks) - sum(1 for chunk_hash in hashes if chunk_hash in missing)
+
+        if missing:
+            fresh = await self._fan_out(
+                [CHUNK_PROMPT + "\n\nExcerpt: " + chunk for chunk in missing.values()],
+                stats
+            )
+            fresh = list(zip(missing, fresh))
+            known.update(fresh)
+            if self.summary_store is not None:
+                self.summary_store.put_chunk_summaries(fresh, self.chunk_variant)
+        return [known[chunk_hash] for chunk_hash in hashes]
+
+    async def map_reduce_summary(self, chunks: List[str], document: Optional[str] = None) -> Tuple[str, Dict]:
+        """Summarize chunks concurrently, then merge the partial summaries level by level.
+
+        document is the text the chunks came from; when it fits one prompt
+        it is summarized directly. Returns the final summary and per-stage stats (calls, summed call
+        latency, wall time and token counts). Chunks whose summary is
+        already stored are not sent to the model again.
+        """
+        stages = {
+            stage: {"calls": 0, "latency_ms": 0.0, "wall_ms": 0.0, "input_tokens": 0, "output_tokens": 0}
+            for stage in ("map", "reduce", "final")
+        }
+        stages["map"]["reused"] = 0
+        stages["reduce"]["levels"] = 0
+
+        if document is None:
+            document = "".join(chunks)
+        if len(document) <= self.context_chars:
+            # The whole document fits in one prompt: nothing to map or reduce
+            partials = [document]
+        else:
+            partials = await self._map_chunks(chunks, stages["map"])
+
+        while (
+            len(partials) > 1
+            and sum(len(partial) for partial in partials) > self.context_chars
+            and stages["reduce"]["levels"] < MAX_REDUCE_LEVELS
+        ):
+            groups = self._group_for_reduce(partials)
+            partials = await self._fan_out(
+                [COMBINE_PROMPT + "\n\nPartial summaries:\n\n" + "\n\n".join(group) for group in groups],
+                stages["reduce"]
+            )
+            stages["reduce"]["levels"] += 1
+
+        started = time.perf_counter()
+        summary = await self._complete(
+            SUMMARY_PROMPT + "\n\nDocument: " + "\n\n".join(partials),
+            stages["final"]
         )
+        stages["final"]["wall_ms"] += (time.perf_counter() - started) * 1000.0
+        return summary, stages
+
+    async def generate_document_summary(
+        self,
+        document_content: Optional[str] = None,
+        pdf_path: Optional[str] = None
+    ) -> Dict:
+        """Generate a comprehensive document summary.
 
-    async def generate_document_summary(self, document_content: str, pdf_path: Optional[str] = None) -> Dict:
-        """Generate a comprehensive document summary"""
+        Text is taken from pdf_path when document_content is not given. An
+        unchanged document returns its stored summary without any model call
+        (metadata.cached is True); an edited one only re-summarizes the
+        chunks whose text changed before redoing the reduce step.
+        """
         try:
+            if document_content is None:
+                if not pdf_path:
+                    raise ValueError("Either document_content or pdf_path is required")
+                document_content = await asyncio.get_running_loop().run_in_executor(
+                    None, self.extract_pdf_text, pdf_path
+                )
+
+            document_hash = content_hash(document_content)
+            if self.summary_store is not None:
+                stored = self.summary_store.get_document_summary(document_hash, self.document_variant)
+                if stored is not None:
+                    summary, metadata = stored
+                    return {"summary": summary, "metadata": {**metadata, "cached": True}}
+
             # Split text into chunks if it's too long
-            chunks = self.text_splitter.split_text(document_content)
-            
-            # Generate summary prompt
-            summary_prompt = (
-                "Generate a comprehensive summary of this document, "
-                "including key findings, methodology, and conclusions. "
-                "Format the response with clear sections."
-            )
+            chunks = self.split_into_chunks(document_content)
+            if not chunks:
+                raise ValueError("Document has no text to summarize")
             
-            # Generate summary using the NVIDIA model
-            summary = await self.model.agenerate(
-                [summary_prompt + "\n\nDocument: " + chunk for chunk in chunks]
-            )
-
-            return {
-                "summary": summary.generations[0][0].text,
-                "metadata": {
-                    "chunks_processed": len(chunks),
-                    "text_processed": True,
-                    "generated_at": str(datetime.now())
-                }
+            summary, stages = await self.map_reduce_summary(chunks, document_content)
+            metadata = {
+                "chunks_processed": len(chunks),
+                "text_processed": True,
+                "generated_at": str(datetime.now()),
+                "stages": stages
             }
+            if self.summary_store is not None:
+                self.summary_store.put_document_summary(
+                    document_hash, self.document_variant, summary, metadata
+                )
+
+            return {"summary": summary, "metadata": {**metadata, "cached": False}}
 
         except Exception as e:
             raise Exception(f"Error generating summary: {str(e)}")
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+import threading
+from app.config.settings import settings
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    """Persisted chunk-level and document-level summaries, addressed by content hash.
+
+    Chunk summaries are keyed by (chunk hash, variant) and document
+    summaries by (document text hash, variant), where the variant
+    identifies the model and prompts that produced them. A document whose
+    text changed slightly only misses on the chunks that actually changed.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_summaries ("
+            "chunk_hash TEXT NOT NULL, variant TEXT NOT NULL, summary TEXT NOT NULL, "
+            "PRIMARY KEY (chunk_hash, variant))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS document_summaries ("
+            "document_hash TEXT NOT NULL, variant TEXT NOT NULL, summary TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, PRIMARY KEY (document_hash, variant))"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get_chunk_summaries(self, chunk_hashes: Sequence[str], variant: str) -> Dict[str, str]:
+        hashes = list(dict.fromkeys(chunk_hashes))
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT chunk_hash, summary FROM chunk_summaries "
+                    f"WHERE variant = ? AND chunk_hash IN ({placeholders})",
+                    [variant, *batch]
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_chunk_summaries(self, summaries: List[Tuple[str, str]], variant: str):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_summaries (chunk_hash, variant, summary) VALUES (?, ?, ?)",
+                [(chunk_hash, variant, summary) for chunk_hash, summary in summaries]
+            )
+            self._conn.commit()
+
+    def get_document_summary(self, document_hash: str, variant: str) -> Optional[Tuple[str, Dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, metadata FROM document_summaries WHERE document_hash = ? AND variant = ?",
+                (document_hash, variant)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put_document_summary(self, document_hash: str, variant: str, summary: str, metadata: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO document_summaries (document_hash, variant, summary, metadata) "
+                "VALUES (?, ?, ?, ?)",
+                (document_hash, variant, summary, json.dumps(metadata, default=str))
+            )
+            self._conn.commit()
+
+
+@lru_cache()
+def get_summary_store() -> Optional[SummaryStore]:
+    """Process-wide store, or None when SUMMARY_STORE_PATH is empty"""
+    if not settings.SUMMARY_STORE_PATH:
+        return None
+    return SummaryStore(settings.SUMMARY_STORE_PATH)
@@ -1,43 +1,205 @@
 from llama_index import (
-    VectorStoreIndex,
-    Document as LlamaDocument,
     StorageContext,
     ServiceContext,
     Node
 )
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Tuple, Union
+from itertools import islice
+import asyncio
+import io
 import numpy as np
 from datetime import datetime
-import pickle
+from app.config.settings import settings
+from .corpus_index import CorpusIndex
+from .chunking import iter_chunks
+from .embedding_batcher import get_embedding_batcher
+from .embedding_cache import get_embedding_cache
+from .note_graph import NoteGraph
+
+# search_type values accepted by search_document and the row type they map to
+SEARCH_TYPE_FILTERS = {
+    "documents": "document",
+    "notes": "research_note",
+}
 
 class VectorStoreService:
     def __init__(self):
         self.storage_context = StorageContext.from_defaults()
         self.service_context = ServiceContext.from_defaults()
-        self.document_indices = {}
-        self.research_notes_indices = {}
+        # One corpus-wide index; document_id is a filter column, not a separate index
+        self.corpus_index = CorpusIndex()
+        self._compaction_task = None
+        # Precomputed neighbours per note_id, maintained as notes change
+        self.note_graph = NoteGraph(k=settings.NOTE_GRAPH_NEIGHBORS)
         self.document_chunks = {}
-        self.chunk_size = 500  # Default chunk size
+        self.chunk_size = 500  # Default chunk size, in words
+        self.chunk_overlap = 50  # Words repeated at the start of the next chunk
+        self.embed_batch_size = settings.EMBEDDING_BATCH_SIZE  # Chunks handed to the batcher at once
 
-    async def add_document(self, document_id: str, content: str, metadata: Optional[Dict] = None):
-        """Add document to vector store"""
-        try:
-            # Create document nodes
-            nodes = [
+        # Every VectorStoreService using the same model shares one batcher and cache
+        embed_model = self.service_context.embed_model
+        self.embedding_model_id = (
+            f"llama_index:{getattr(embed_model, 'model_name', type(embed_model).__name__)}"
+        )
+        self.embedding_cache = get_embedding_cache()
+        self.embedding_batcher = get_embedding_batcher(
+            self.embedding_model_id,
+            embed_model.get_text_embedding_batch,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_wait_ms=settings.EMBEDDING_MAX_WAIT_MS,
+            cache=self.embedding_cache
+        )
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts through the shared batcher"""
+        return await self.embedding_batcher.embed(texts)
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Embed a search query, reusing the cached vector for repeated queries"""
+        # Query embeddings can differ from text embeddings (instruction prefixes)
+        model_id = f"{self.embedding_model_id}:query"
+        loop = asyncio.get_running_loop()
+        embedding = await loop.run_in_executor(None, self.embedding_cache.get, model_id, query)
+        if embedding is None:
+            embedding = await loop.run_in_executor(
+                None, self.service_context.embed_model.get_query_embedding, query
+            )
+            await loop.run_in_executor(None, self.embedding_cache.put, model_id, query, embedding)
+        return embedding
+
+    async def _add_nodes(self, nodes: List[Node]):
+        """Embed nodes and append them to the corpus index"""
+        texts = [node.text for node in nodes]
+        self.corpus_index.add(
+            await self._embed_texts(texts),
+            texts,
+            [node.metadata for node in nodes]
+        )
+
+    async def _replace_nodes(self, where: Dict[str, str], nodes: List[Node]):
+        """Swap the rows matching the filter for freshly embedded nodes"""
+        self.corpus_index.delete(where)
+        await self._add_nodes(nodes)
+        self._schedule_compaction()
+
+    async def _index_chunks(
+        self,
+        document_id: str,
+        chunks: Iterable[Dict],
+        metadata: Optional[Dict] = None
+    ):
+        """Replace a document's rows with one node per chunk, embedding batch by batch"""
+        self.corpus_index.delete({"document_id": document_id, "type": "document"})
+        indexed_at = datetime.utcnow().isoformat()
+        chunks = iter(chunks)
+        while True:
+            batch = list(islice(chunks, self.embed_batch_size))
+            if not batch:
+                break
+            await self._add_nodes([
                 Node(
-                    text=content,
+                    text=chunk["content"],
                     metadata={
                         "document_id": document_id,
+                        "type": "document",
+                        "timestamp": indexed_at,
+                        "chunk_index": chunk.get("index"),
+                        "start_offset": chunk.get("start"),
+                        "end_offset": chunk.get("end"),
                         **(metadata or {})
                     }
                 )
-            ]
-            
-            # Create or update index for this document
-            self.document_indices[document_id] = VectorStoreIndex(
-                nodes,
-                storage_context=self.storage_context,
-                service_context=self.service_context
+                for chunk in batch
+            ])
+        self._schedule_compaction()
+
+    def _iter_document_chunks(self, content: Union[str, Iterable[str]]):
+        """Chunk a full text or an iterator of pages/lines"""
+        pieces = io.StringIO(content) if isinstance(content, str) else content
+        return iter_chunks(pieces, self.chunk_size, self.chunk_overlap)
+
+    def _schedule_compaction(self):
+        """Compact the corpus index in a worker thread once tombstones pile up"""
+        if self._compaction_task is not None and not self._compaction_task.done():
+            return
+        if not self.corpus_index.needs_compaction:
+            return
+        loop = asyncio.get_running_loop()
+        self._compaction_task = loop.run_in_executor(None, self.corpus_index.compact)
+
+    def _note_vector(self, note_id: str) -> Optional[np.ndarray]:
+        vectors = self.corpus_index.vectors_where({"note_id": note_id}, "note_id")
+        return vectors[-1][1] if vectors else None
+
+    def _link_note(self, note_id: str, embedding: np.ndarray):
+        """Look up a note's nearest notes in the index and record them in the graph"""
+        hits = self.corpus_index.search(
+            embedding,
+            top_k=self.note_graph.k + 1,
+            where={"type": "research_note"}
+        )
+        neighbors = []
+        for hit in hits:
+            neighbor = hit["metadata"].get("note_id")
+            if neighbor is not None and neighbor != note_id:
+                neighbors.append((neighbor, hit["score"]))
+        self.note_graph.link(note_id, neighbors)
+
+    def _unlink_note(self, note_id: str):
+        """Drop a note from the graph and re-link the notes that pointed at it"""
+        for affected in self.note_graph.unlink(note_id):
+            embedding = self._note_vector(affected)
+            if embedding is not None:
+                self._link_note(affected, embedding)
+
+    def rebuild_note_graph(self):
+        """Recompute the graph for every note in the index"""
+        self.note_graph.clear()
+        for note_id, embedding in self.corpus_index.vectors_where({"type": "research_note"}, "note_id"):
+            if note_id is not None:
+                self._link_note(note_id, embedding)
+
+    def similar_notes(
+        self,
+        note_id: str,
+        limit: int = 5,
+        rerank: bool = False
+    ) -> List[Dict]:
+        """Closest notes to note_id, read from the neighbour graph.
+
+        With rerank, the stored neighbours are re-scored against their current
+        embeddings instead of trusting the scores recorded when they were linked.
+        """
+        embedding = self._note_vector(note_id)
+        if embedding is None:
+            raise Exception(f"Research note {note_id} not found in vector store")
+        if note_id not in self.note_graph:
+            self._link_note(note_id, embedding)
+
+        neighbors = self.note_graph.neighbors(note_id)
+        if rerank:
+            results = self.corpus_index.fetch("note_id", [neighbor for neighbor, _ in neighbors], embedding)
+            results.sort(key=lambda result: -result["score"])
+        else:
+            scores = dict(neighbors)
+            results = self.corpus_index.fetch("note_id", [neighbor for neighbor, _ in neighbors])
+            for result in results:
+                result["score"] = scores[result["metadata"]["note_id"]]
+        return results[:limit]
+
+    async def add_document(
+        self,
+        document_id: str,
+        content: Union[str, Iterable[str]],
+        metadata: Optional[Dict] = None
+    ):
+        """Add document to vector store"""
+        try:
+            # Create or update the rows for this document, one per chunk
+            await self._index_chunks(
+                document_id,
+                self._iter_document_chunks(content),
+                metadata
             )
             
         except Exception as e:
@@ -48,47 +210,59 @@ class VectorStoreService:
         query: str,
         document_id: Optional[str] = None,
         search_type: str = "all",
-        top_k: int = 5
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        after: Optional[Tuple[float, str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
     ) -> Dict:
-        """Search through documents"""
+        """Search through documents; `after` is a (score, node_id) pagination watermark"""
         try:
-            if document_id and document_id in self.document_indices:
-                # Search specific document
-                index = self.document_indices[document_id]
-                retriever = index.as_retriever(similarity_top_k=top_k)
-                nodes = retriever.retrieve(query)
-            else:
-                # Search all documents
-                all_nodes = []
-                for doc_index in self.document_indices.values():
-                    retriever = doc_index.as_retriever(similarity_top_k=top_k)
-                    nodes = retriever.retrieve(query)
-                    all_nodes.extend(nodes)
-                nodes = sorted(all_nodes, key=lambda x: x.score, reverse=True)[:top_k]
+            where = {}
+            if document_id:
+                where["document_id"] = document_id
+            if search_type in SEARCH_TYPE_FILTERS:
+                where["type"] = SEARCH_TYPE_FILTERS[search_type]
+
+            if query_embedding is None:
+                query_embedding = await self.embed_query(query)
+
+            # One lookup against the corpus index, whatever the number of documents
+            hits = self.corpus_index.search(
+                query_embedding,
+                top_k=top_k,
+                where=where,
+                after=after,
+                time_range=(start_date, end_date) if start_date or end_date else None
+            )
             
-            return {
-                "results": [
-                    {
-                        "id": node.metadata.get("document_id"),
-                        "content": node.text,
-                        "score": node.score,
-                        "metadata": node.metadata
-                    }
-                    for node in nodes
-                ]
-            }
+            return {"results": hits}
             
         except Exception as e:
             raise Exception(f"Error searching documents: {str(e)}")
 
-    async def search_research_notes(self, document_id: str, query: str, top_k: int = 5):
+    async def search_research_notes(
+        self,
+        document_id: Optional[str] = None,
+        query: Optional[str] = None,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        after: Optional[Tuple[float, str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[Dict]:
         """Search through research notes"""
-        if document_id not in self.research_notes_indices:
-            return []
-        
-        query_engine = self.research_notes_indices[document_id].as_query_engine()
-        response = query_engine.query(query)
-        return response.source_nodes[:top_k]
+        results = await self.search_document(
+            query=query,
+            document_id=document_id,
+            search_type="notes",
+            top_k=top_k,
+            query_embedding=query_embedding,
+            after=after,
+            start_date=start_date,
+            end_date=end_date
+        )
+        return results["results"]
 
     async def add_research_note(
         self,
@@ -109,14 +283,20 @@ class VectorStoreService:
                 }
             )
             
-            if document_id not in self.document_indices:
-                self.document_indices[document_id] = VectorStoreIndex(
-                    [node],
-                    storage_context=self.storage_context,
-                    service_context=self.service_context
+            if node.metadata.get("note_id"):
+                # Notes with an id are upserted so re-adding one never duplicates it
+                note_id = node.metadata["note_id"]
+                self.corpus_index.upsert(
+                    "note_id",
+                    (await self._embed_texts([note]))[0],
+                    note,
+                    node.metadata
                 )
+                self._unlink_note(note_id)
+                self._link_note(note_id, self._note_vector(note_id))
+                self._schedule_compaction()
             else:
-                self.document_indices[document_id].insert_nodes([node])
+                await self._add_nodes([node])
                 
         except Exception as e:
             raise Exception(f"Error adding research note: {str(e)}")
@@ -129,11 +309,10 @@ class VectorStoreService:
     ):
         """Update existing research note"""
         try:
-            if document_id not in self.document_indices:
+            if not self.corpus_index.has_document(document_id):
                 raise Exception("Document not found in vector store")
                 
-            # Remove old note and add updated one
-            await self.remove_research_note(document_id, note_id)
+            # Upsert by note_id: only the edited note is re-embedded
             await self.add_research_note(
                 document_id=document_id,
                 note=new_content,
@@ -147,87 +326,45 @@ class VectorStoreService:
     async def remove_research_note(self, document_id: str, note_id: str):
         """Remove research note from vector store"""
         try:
-            if document_id not in self.document_indices:
-                return
-                
-            index = self.document_indices[document_id]
-            # Filter out the note to be removed
-            nodes = [
-                node for node in index.docstore.docs.values()
-                if node.metadata.get("note_id") != note_id
-            ]
-            
-            # Recreate index without the removed note
-            self.document_indices[document_id] = VectorStoreIndex(
-                nodes,
-                storage_context=self.storage_context,
-                service_context=self.service_context
-            )
+            # Tombstone the note; compaction reclaims the row later
+            self.corpus_index.delete({
+                "document_id": document_id,
+                "note_id": note_id
+            })
+            self._unlink_note(note_id)
+            self._schedule_compaction()
             
         except Exception as e:
             raise Exception(f"Error removing research note: {str(e)}")
 
     def save_indices(self, path: str):
-        """Save indices to disk"""
-        with open(path, 'wb') as f:
-            pickle.dump({
-                'documents': self.document_indices,
-                'notes': self.research_notes_indices
-            }, f)
+        """Save indices to disk as a memory-mappable segment directory"""
+        self.corpus_index.save(path)
 
     def load_indices(self, path: str):
-        """Load indices from disk"""
-        with open(path, 'rb') as f:
-            indices = pickle.load(f)
-            self.document_indices = indices['documents']
-            self.research_notes_indices = indices['notes']
+        """Load indices from disk; vectors, columns and (with faiss >= 1.11) the graph are memory-mapped"""
+        self.corpus_index = CorpusIndex.load(path)
+        self.rebuild_note_graph()
 
-    async def chunk_document(self, content: str) -> List[Dict]:
+    async def chunk_document(self, content: Union[str, Iterable[str]]) -> List[Dict]:
         """Chunk document for efficient processing"""
-        chunks = []
-        current_chunk = ""
-        current_size = 0
-        
-        for line in content.split('\n'):
-            line_size = len(line.split())
-            if current_size + line_size > self.chunk_size:
-                chunks.append({
-                    "content": current_chunk,
-                    "size": current_size
-                })
-                current_chunk = line
-                current_size = line_size
-            else:
-                current_chunk += f"\n{line}"
-                current_size += line_size
-            
-        if current_chunk:
-            chunks.append({
-                "content": current_chunk,
-                "size": current_size
-            })
-        
-        return chunks
+        return list(self._iter_document_chunks(content))
 
     async def update_document_chunks(self, document_id: str, chunks: List[Dict]):
         """Update document chunks in cache"""
         self.document_chunks[document_id] = chunks
-        await self.create_document_index(document_id, chunks)
+        await self._index_chunks(document_id, chunks)
 
-    async def create_document_index(self, document_id: str, content: str):
+    async def create_document_index(self, document_id: str, content: Union[str, Iterable[str]]):
         """Create or update document index"""
-        documents = [LlamaDocument(text=content)]
-        self.document_indices[document_id] = VectorStoreIndex.from_documents(
-            documents,
-            storage_context=self.storage_context,
-            service_context=self.service_context
-        )
+        await self._index_chunks(document_id, self._iter_document_chunks(content))
 
     async def create_research_notes_index(self, document_id: str, notes: List[str]):
         """Create or update research notes index"""
-        documents = [LlamaDocument(text=note) for note in notes]
-        self.research_notes_indices[document_id] = VectorStoreIndex.from_documents(
-            documents,
-            storage_context=self.storage_context,
-            service_context=self.service_context
+        await self._replace_nodes(
+            {"document_id": document_id, "type": "research_note"},
+            [
+                Node(text=note, metadata={"document_id": document_id, "type": "research_note"})
+                for note in notes
+            ]
         )
\ No newline at end of file
@@ -0,0 +1,113 @@
+from typing import Any, Dict, Iterable, Optional
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import pickle
+import sqlite3
+import threading
+import numpy as np
+from app.config.nemo_config import nemo_config
+from .embedding_cache import to_numpy
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """sha256 of a file's bytes, so renamed or re-downloaded copies share entries"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VisualFeatureStore:
+    """Persistent per-page visual features keyed by (file hash, page, model version).
+
+    Each entry holds the image embedding (float32) and the pickled
+    analyze_image output for one page; standalone images use page 0. The
+    SQLite file is shared by every worker, so a document is rasterized and
+    encoded once per model version no matter which endpoint asks for it.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS visual_features ("
+            "file_hash TEXT NOT NULL, page INTEGER NOT NULL, model TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, analysis BLOB NOT NULL, "
+            "PRIMARY KEY (file_hash, page, model))"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_pages(self, file_hash: str, model: str, pages: Iterable[int]) -> Dict[int, Dict]:
+        """Cached features for the requested pages; missing pages are left out"""
+        pages = list(pages)
+        found: Dict[int, Dict] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(pages), 500):
+                batch = pages[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT page, embedding, analysis FROM visual_features "
+                    f"WHERE file_hash = ? AND model = ? AND page IN ({placeholders})",
+                    [file_hash, model, *batch]
+                ).fetchall()
+                for page, embedding, analysis in rows:
+                    found[page] = {
+                        "embedding": np.frombuffer(embedding, dtype=np.float32).copy(),
+                        "analysis": pickle.loads(analysis)
+                    }
+            self.hits += len(found)
+            self.misses += len(pages) - len(found)
+        return found
+
+    def put_pages(self, file_hash: str, model: str, features: Dict[int, Dict[str, Any]]):
+        rows = [
+            (
+                file_hash,
+                page,
+                model,
+                to_numpy(feature["embedding"]).tobytes(),
+                pickle.dumps(_to_cpu(feature["analysis"]))
+            )
+            for page, feature in features.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO visual_features "
+                "(file_hash, page, model, embedding, analysis) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def _to_cpu(value: Any) -> Any:
+    """Move tensors nested in an analysis result off the GPU before pickling"""
+    if hasattr(value, "detach"):
+        return value.detach().cpu()
+    if isinstance(value, dict):
+        return {key: _to_cpu(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_cpu(item) for item in value)
+    return value
+
+
+@lru_cache()
+def get_visual_feature_store() -> Optional[VisualFeatureStore]:
+    """Process-wide store, or None when NEMO_VISUAL_FEATURE_STORE_PATH is empty"""
+    if not nemo_config.VISUAL_FEATURE_STORE_PATH:
+        return None
+    return VisualFeatureStore(nemo_config.VISUAL_FEATURE_STORE_PATH)
@@ -0,0 +1,67 @@
+"""Compare the old per-document search loop with the corpus-wide index.
+
+Run from BDIA-3/backend:
+
+    python benchmarks/corpus_index_benchmark.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.corpus_index import CorpusIndex
+
+DIM = 384
+CHUNKS_PER_DOCUMENT = 4
+TOP_K = 5
+QUERIES = 50
+
+
+def per_document_search(document_vectors, query, top_k):
+    """What search_document used to do: one retrieval per document index, then a global sort"""
+    hits = []
+    for document_id, vectors in document_vectors.items():
+        scores = vectors @ query
+        best = np.argsort(-scores)[:top_k]
+        hits.extend((float(scores[i]), document_id, int(i)) for i in best)
+    return sorted(hits, reverse=True)[:top_k]
+
+
+def run(num_documents, rng):
+    document_vectors = {}
+    index = CorpusIndex()
+    for doc in range(num_documents):
+        vectors = rng.standard_normal((CHUNKS_PER_DOCUMENT, DIM)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        document_id = f"doc-{doc}"
+        document_vectors[document_id] = vectors
+        index.add(
+            vectors,
+            [""] * CHUNKS_PER_DOCUMENT,
+            [{"document_id": document_id, "type": "document"}] * CHUNKS_PER_DOCUMENT
+        )
+
+    queries = rng.standard_normal((QUERIES, DIM)).astype(np.float32)
+
+    start = time.perf_counter()
+    for query in queries:
+        per_document_search(document_vectors, query, TOP_K)
+    loop_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, top_k=TOP_K)
+    index_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+    print(
+        f"{num_documents:>6} documents | per-document loop {loop_ms:8.2f} ms/query "
+        f"| corpus index {index_ms:6.2f} ms/query | speedup {loop_ms / index_ms:6.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for num_documents in (100, 1_000, 10_000):
+        run(num_documents, rng)
@@ -0,0 +1,43 @@
+"""Tests for streaming chunking, which needs nothing beyond the standard library.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chunking import iter_chunks  # noqa: E402
+
+
+def test_token_split_across_pieces_counts_once():
+    chunks = list(iter_chunks(["hel", "lo world"], max_tokens=5, overlap_tokens=0))
+
+    assert len(chunks) == 1
+    assert chunks[0]["size"] == 2
+    assert chunks[0]["content"] == "hello world"
+    assert (chunks[0]["start"], chunks[0]["end"]) == (0, 11)
+
+
+def test_chunks_match_unsplit_text_wherever_pieces_break():
+    text = " ".join(f"word{i}" for i in range(40))
+    expected = list(iter_chunks([text], max_tokens=7, overlap_tokens=2))
+
+    for width in (1, 3, 5, 11):
+        pieces = [text[i:i + width] for i in range(0, len(text), width)]
+        assert list(iter_chunks(pieces, max_tokens=7, overlap_tokens=2)) == expected
+
+
+def test_offsets_point_into_the_joined_pieces():
+    pieces = ["alpha be", "ta\n", "gamma ", "delta epsi", "lon"]
+    text = "".join(pieces)
+
+    chunks = list(iter_chunks(pieces, max_tokens=2, overlap_tokens=1))
+
+    assert [chunk["content"] for chunk in chunks] == [
+        "alpha beta", "beta\ngamma", "gamma delta", "delta epsilon"
+    ]
+    for chunk in chunks:
+        assert text[chunk["start"]:chunk["end"]] == chunk["content"]
@@ -4,10 +4,8 @@ import json
 from dotenv import load_dotenv
 from google.cloud import storage
 import re
-import requests
 import logging
 import re
-from urllib.parse import unquote
 import json
 from airflow import DAG
 from airflow.operators.python_operator import PythonOperator
@@ -26,6 +24,11 @@ from google.cloud import storage
 import urllib.parse
 from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.options import Options
+from snowflake_loader import PUBLICATIONS_COLUMNS, PUBLICATIONS_DDL, merge_rows, replace_table_atomically, stage_url
+from asset_downloader import DOWNLOADED, FAILED, PARTIAL_SUFFIXES, AssetDownloader, create_session, download_asset
+from gcs_uploader import upload_files
+from publication_manifest import listing_fingerprint, load_manifest, row_hash, save_manifest
+from title_index import TitleIndex
 
 # Logger setup
 logger = logging.getLogger(__name__)
@@ -50,6 +53,8 @@ SNOWFLAKE_SCHEMA = 'PUBLICATIONS_SCHEMA'
 SNOWFLAKE_ROLE = 'ACCOUNTADMIN'
 GCS_BUCKET_NAME = os.getenv('BUCKET_NAME')
 GCS_JSON_BLOB_NAME = 'cfai_publications/cfa_publications.json'
+# Incremental runs skip known publications and MERGE only changed rows; 'false' forces a full crawl and reload
+INCREMENTAL_MODE = os.getenv('INCREMENTAL_MODE', 'true').lower() == 'true'
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -70,23 +75,9 @@ def extract_detail_data(driver):
     return pdf_link
 
 def download_file(url, download_folder, filename):
-    if url and url != 'N/A':
-        try:
-            logger.info(f"Downloading: {url}")
-            response = requests.get(url)
-            response.raise_for_status()
-            if not os.path.exists(download_folder):
-                os.makedirs(download_folder)
-            safe_filename = filename.replace('/', '-')
-            file_path = os.path.join(download_folder, safe_filename)
-            with open(file_path, 'wb') as file:
-                file.write(response.content)
-            logger.info(f"Downloaded: {file_path}")
-            return file_path
-        except Exception as e:
-            logger.error(f"Failed to download {url}: {e}")
-            return None
-    return None
+    """Stream one file to disk with retries; the scraper itself queues files on an AssetDownloader."""
+    with create_session(1) as session:
+        return download_asset(session, url, download_folder, filename).file_path
 
 def clean_filename(filename):
     return re.sub(r'\?.*$', '', filename)
@@ -95,35 +86,38 @@ def generate_authenticated_url(bucket_name, destination_blob_name):
     """Generate an authenticated URL for GCS."""
     return f"https://storage.googleapis.com/{bucket_name}/{urllib.parse.quote(destination_blob_name)}"
 
-def upload_to_gcs(bucket_name, source_folder, destination_blob_name):
-    """Uploads specific folders to a GCS bucket and returns URLs for the uploaded files."""
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
+def upload_to_gcs(bucket_name, source_folder, destination_blob_name, folders=None):
+    """Uploads specific folders to a GCS bucket and returns URLs for the uploaded files.
 
+    folders limits the upload to those publication folders; None uploads all of them.
+    Files whose checksum matches the blob already in the bucket are not uploaded again.
+    """
     # Define folders to exclude (e.g., venv)
     exclude_dirs = {'venv', '__pycache__', '.git','dags', 'logs'}
     publication_links = {}
+    uploads = []
 
-    # Upload each publication folder, excluding any irrelevant folders
-    for publication_folder in os.listdir(source_folder):
+    # Collect each publication folder, excluding any irrelevant folders
+    for publication_folder in sorted(folders) if folders is not None else os.listdir(source_folder):
         folder_path = os.path.join(source_folder, publication_folder)
 
-        if os.path.isdir(folder_path) and publication_folder not in exclude_dirs:
+        if os.path.isdir(folder_path) and publication_folder not in exclude_dirs and not publication_folder.startswith('.'):
             pdf_gcs_link = None
             image_gcs_link = None
 
-            # Upload files and capture GCS links
+            # Queue files and capture GCS links
             for dirpath, _, filenames in os.walk(folder_path):
                 for filename in filenames:
+                    # Transfers the download stage did not finish
+                    if filename.endswith(PARTIAL_SUFFIXES):
+                        continue
                     # File paths and cleaned name
                     local_file_path = os.path.join(dirpath, filename)
                     clean_name = clean_filename(filename)
                     relative_path = os.path.relpath(os.path.join(dirpath, clean_name), source_folder)
-                    blob = bucket.blob(os.path.join(destination_blob_name, relative_path))
-
-                    # Upload file
-                    blob.upload_from_filename(local_file_path)
-                    gcs_link = generate_authenticated_url(bucket_name, os.path.join(destination_blob_name, relative_path))
+                    blob_name = os.path.join(destination_blob_name, relative_path)
+                    uploads.append((local_file_path, blob_name))
+                    gcs_link = generate_authenticated_url(bucket_name, blob_name)
 
                     # Store GCS link based on file type
                     if clean_name.endswith('.pdf'):
@@ -137,6 +131,8 @@ def upload_to_gcs(bucket_name, source_folder, destination_blob_name):
                 "image_gcs_link": image_gcs_link
             }
 
+    # Upload in parallel, skipping unchanged files
+    upload_files(bucket_name, uploads, destination_blob_name.rstrip('/') + '/')
     return publication_links
 
 def upload_json_to_gcs(bucket_name, json_file_name, destination_blob_name):
@@ -160,6 +156,19 @@ def scrape_publications():
     seen_titles = set()
     publication_index = 1
 
+    # Known publications; a full run ignores them but still refreshes the manifest
+    manifest = load_manifest(gcs_bucket_name)
+    known = manifest if INCREMENTAL_MODE else {}
+    visited = {}
+    # New listing fingerprints, recorded only for publications whose files all came through
+    fingerprints = {}
+    failed_titles = set()
+    publication_folders = set()
+    changed_folders = set()
+    # Files download in the background while Selenium keeps paging
+    downloader = AssetDownloader()
+    downloads = []
+
     try:
         driver.get("https://rpc.cfainstitute.org/en/research-foundation/publications#sort=%40officialz32xdate%20descending&f:SeriesContent=[Research%20Foundation]")
         while True:
@@ -170,6 +179,7 @@ def scrape_publications():
             if not publications:
                 logger.warning("No publications found on the page.")
                 break
+            page_has_changes = False
             for publication in publications:
                 title_element = publication.find('h4', class_='coveo-title')
                 title = title_element.get_text(strip=True) if title_element else 'N/A'
@@ -189,6 +199,18 @@ def scrape_publications():
                     image_src = 'https://rpc.cfainstitute.org' + image_src
                 summary_element = publication.find('div', class_='result-body')
                 summary = summary_element.get_text(strip=True) if summary_element else 'N/A'
+
+                # Unchanged on the listing: reuse the last record, no detail page or downloads
+                fingerprint = listing_fingerprint(detail_link, publication_date, image_src, summary)
+                entry = known.get(title)
+                if entry and entry.get('fingerprint') == fingerprint and entry.get('record'):
+                    all_data.append({**entry['record'], 'Index': publication_index})
+                    publication_index += 1
+                    continue
+                page_has_changes = True
+                entry = dict(entry or {})
+                fingerprints[title] = fingerprint
+
                 pdf_link = 'N/A'
                 if detail_link:
                     logger.info(f"Loading detail page for: {title}...")
@@ -196,15 +218,20 @@ def scrape_publications():
                     WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CLASS_NAME, "grid__item--article-element")))
                     pdf_link = extract_detail_data(driver)
                     publication_folder = clean_title(title)
+                    publication_folders.add(publication_folder)
                     if not os.path.exists(publication_folder):
                         os.makedirs(publication_folder)
-                    download_file(pdf_link, publication_folder, f"{title}.pdf")
+                    # Files whose ETag, Last-Modified or content hash still match are not re-downloaded
+                    downloads.append((title, entry, 'pdf', publication_folder, downloader.submit(
+                        pdf_link, publication_folder, f"{title}.pdf", entry.get('pdf'))))
                     if image_src != 'N/A':
                         file_extension = image_src.split('.')[-1]
-                        download_file(image_src, publication_folder, f"{title}.{file_extension}")
+                        downloads.append((title, entry, 'image', publication_folder, downloader.submit(
+                            image_src, publication_folder, f"{title}.{file_extension}", entry.get('image'))))
                     driver.back()
                     WebDriverWait(driver, 20).until(EC.presence_of_all_elements_located((By.CLASS_NAME, "RPCAllsiteSearchResultList")))
-                
+                visited[title] = entry
+
                 # Add GCS links to all_data
                 all_data.append({
                     'Index': publication_index,
@@ -212,10 +239,18 @@ def scrape_publications():
                     'Date': publication_date,
                     'Summary': summary,
                     'PDF Link': pdf_link,  # Keep the local PDF link for downloading
-                    'Image Link': image_src  # Local image link for downloading
+                    'Image Link': image_src,  # Local image link for downloading
+                    # Previous links stand in for files that did not change
+                    'pdf_gcs_link': (entry.get('record') or {}).get('pdf_gcs_link'),
+                    'image_gcs_link': (entry.get('record') or {}).get('image_gcs_link')
                 })
                 publication_index += 1
-            
+
+            # Newest first, so a page of only known publications means the rest are known too
+            if INCREMENTAL_MODE and known and not page_has_changes:
+                logger.info("Only known publications on this page; stopping.")
+                break
+
             try:
                 next_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "coveo-pager-next")))
                 if 'disabled' in next_button.get_attribute('class'):
@@ -228,18 +263,31 @@ def scrape_publications():
                 logger.error(f"Error navigating to the next page: {e}")
                 break
 
-        # Upload files to GCS and get their links
-        publication_links = upload_to_gcs(gcs_bucket_name, '.', gcs_path)
+        # Wait for the download stage before uploading
+        for title, entry, kind, publication_folder, future in downloads:
+            result = future.result()
+            entry[kind] = result.validators
+            if result.status == DOWNLOADED:
+                changed_folders.add(publication_folder)
+            elif result.status == FAILED:
+                failed_titles.add(title)
+
+        # Publications on pages that were not reached keep their last record
+        for title, entry in known.items():
+            if title not in seen_titles and entry.get('record'):
+                all_data.append({**entry['record'], 'Index': publication_index})
+                publication_index += 1
+
+        # Upload files to GCS and get their links; incremental runs only upload what changed
+        publication_links = upload_to_gcs(gcs_bucket_name, '.', gcs_path,
+                                          folders=changed_folders if INCREMENTAL_MODE else publication_folders)
 
         # Append GCS links to JSON data
         for item in all_data:
             title_key = clean_title(item['Title'])
-            if title_key in publication_links:
-                item['pdf_gcs_link'] = publication_links[title_key].get('pdf_gcs_link')
-                item['image_gcs_link'] = publication_links[title_key].get('image_gcs_link')
-            else:
-                item['pdf_gcs_link'] = None
-                item['image_gcs_link'] = None
+            links = publication_links.get(title_key, {})
+            item['pdf_gcs_link'] = links.get('pdf_gcs_link') or item.get('pdf_gcs_link')
+            item['image_gcs_link'] = links.get('image_gcs_link') or item.get('image_gcs_link')
 
         # Save JSON to file
         with open(json_file_name, 'w', encoding='utf-8') as json_file:
@@ -249,10 +297,23 @@ def scrape_publications():
         # Upload JSON to GCS
         upload_json_to_gcs(gcs_bucket_name, json_file_name, gcs_path + '/' + json_file_name)
 
+        # Record what was visited, once the JSON it describes is in GCS. A publication with a
+        # failed download keeps its previous entry (or none), so the next run visits it again
+        for item in all_data:
+            title = item['Title']
+            if title in visited and title not in failed_titles:
+                record = {key: value for key, value in item.items() if key != 'Index'}
+                manifest[title] = {**visited[title], 'fingerprint': fingerprints[title], 'record': record}
+        if failed_titles:
+            logger.warning(f"{len(failed_titles)} publications had failed downloads and will be retried next run.")
+        save_manifest(gcs_bucket_name, manifest)
+        logger.info(f"{len(visited)} publications visited, {len(changed_folders)} folders uploaded.")
+
     except Exception as e:
         logger.error(f"An error occurred: {e}")
     finally:
         driver.quit()
+        downloader.close()
 
 def create_or_replace_snowflake_resources():
     """Create or replace Snowflake resources including storage integration, database, schema, and stage."""
@@ -267,18 +328,20 @@ def create_or_replace_snowflake_resources():
         )
 
         cursor = conn.cursor()
+        # The stage must read the bucket the loader writes its batches to
+        bucket_url = stage_url(GCS_BUCKET_NAME)
 
         # Execute SQL statements
         sql_statements = [
             # Drop storage integration if it exists
             "DROP STORAGE INTEGRATION IF EXISTS gcs_int;",
             # Create storage integration
-            """
+            f"""
             CREATE OR REPLACE STORAGE INTEGRATION gcs_int
             TYPE = EXTERNAL_STAGE
             STORAGE_PROVIDER = 'GCS'
             ENABLED = TRUE
-            STORAGE_ALLOWED_LOCATIONS = ('gcs://cfa_scraped_data/');
+            STORAGE_ALLOWED_LOCATIONS = ('{bucket_url}');
             """,
             # Describe storage integration
             "DESC STORAGE INTEGRATION gcs_int;",
@@ -306,9 +369,9 @@ def create_or_replace_snowflake_resources():
             # Drop stage if it exists
             "DROP STAGE IF EXISTS my_gcs_stage;",
             # Create stage
-            """
+            f"""
             CREATE STAGE my_gcs_stage
-            URL = 'gcs://cfa_scraped_data/'
+            URL = '{bucket_url}'
             STORAGE_INTEGRATION = gcs_int
             FILE_FORMAT = my_json_format;
             """
@@ -342,16 +405,6 @@ def list_gcs_files(bucket_name):
     files = {blob.name: f"gs://{bucket_name}/{blob.name}" for blob in blobs}
     return files
 
-def normalize_title(title):
-    """Normalize title by removing special characters for matching."""
-    if not title:
-        return ""
-    # Decode any URL-encoded characters
-    decoded_title = unquote(title)
-    # Remove special characters and normalize spacing
-    normalized = re.sub(r'[^\w\s]', '', decoded_title).replace(' ', '').lower()
-    return normalized
-
 def create_table_and_load_data(publications):
     # Connect to Snowflake
     conn = snowflake.connector.connect(
@@ -367,56 +420,41 @@ def create_table_and_load_data(publications):
     try:
         cursor = conn.cursor()
 
-        # Create the publications_data table
-        create_table_query = """
-        CREATE OR REPLACE TABLE publications_data (
-            title STRING,
-            summary STRING,
-            image_link STRING,
-            pdf_link STRING
-        );
-        """
-        cursor.execute(create_table_query)
-        print("Table 'publications_data' created successfully.")
-
-        # List all files in the GCS bucket
-        gcs_files = list_gcs_files(GCS_BUCKET_NAME)
-
-        # Load data into the publications_data table
+        # Index every GCS file by normalized title once, instead of rescanning per publication
+        title_index = TitleIndex(list_gcs_files(GCS_BUCKET_NAME))
+
+        rows = []
         for pub in publications:
             title = pub.get("Title")
             summary = pub.get("Summary")
 
-            # Normalize title for matching
-            norm_title = normalize_title(title)
-            
-            # Enhanced logic to identify PDF links, ignoring image files
-            pdf_link = next((link for file_name, link in gcs_files.items()
-                             if norm_title in normalize_title(file_name) and 
-                             (file_name.endswith(".pdf") or
-                              ("publications" in file_name.lower() and not file_name.endswith((".jpg", ".png"))))),
-                             None)
-            
-            # Check for PNG files if available, otherwise fall back to .jpg
-            image_link = next((link for file_name, link in gcs_files.items()
-                               if norm_title in normalize_title(file_name) and file_name.endswith(".png")), None)
-
-            # If no PNG is found, check for a .jpg image
-            if not image_link:
-                image_link = next((link for file_name, link in gcs_files.items()
-                                   if norm_title in normalize_title(file_name) and file_name.endswith(".jpg")), None)
+            # PDF link (ignoring image files) and image link, PNG preferred over JPG
+            pdf_link, image_link = title_index.match(title)
 
             # Log details for verification
             print(f"PDF link for '{title}': {pdf_link if pdf_link else 'Not Found'}")
             print(f"Image link for '{title}': {image_link if image_link else 'Not Found'}")
 
-            # Insert data into the table
-            insert_query = """
-            INSERT INTO publications_data (title, summary, image_link, pdf_link)
-            VALUES (%s, %s, %s, %s);
-            """
-            cursor.execute(insert_query, (title, summary, image_link, pdf_link))
-
+            rows.append((title, summary, image_link, pdf_link))
+
+        manifest = load_manifest(GCS_BUCKET_NAME)
+        if INCREMENTAL_MODE:
+            # Only rows that differ from what the last run loaded are merged
+            changed_rows = [row for row in rows if manifest.get(row[0], {}).get('row_hash') != row_hash(row)]
+            method = merge_rows(
+                cursor, "publications_data", "title", PUBLICATIONS_DDL, changed_rows, PUBLICATIONS_COLUMNS, GCS_BUCKET_NAME
+            )
+            print(f"Merged {len(changed_rows)} of {len(rows)} rows via {method}.")
+        else:
+            # One staged COPY INTO a shadow table, swapped in atomically
+            method = replace_table_atomically(
+                cursor, "publications_data", PUBLICATIONS_DDL, rows, PUBLICATIONS_COLUMNS, GCS_BUCKET_NAME
+            )
+            print(f"Loaded {len(rows)} rows via {method}.")
+
+        for row in rows:
+            manifest.setdefault(row[0], {})['row_hash'] = row_hash(row)
+        save_manifest(GCS_BUCKET_NAME, manifest)
         print("Data loaded into 'publications_data' successfully.")
 
     except Exception as e:
@@ -0,0 +1,83 @@
+"""Compare the old per-publication linear scans with TitleIndex on a synthetic bucket listing.
+
+No GCS access is needed. Run from airflow/:
+
+    python benchmarks/title_index_benchmark.py
+
+The linear scans are timed on a sample of publications and extrapolated,
+since the full run is O(publications x files) regex calls.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dags"))
+
+from title_index import TitleIndex, normalize_title
+
+BLOBS = int(os.getenv("BENCHMARK_BLOBS", "50000"))
+SAMPLE = int(os.getenv("BENCHMARK_SAMPLE", "100"))
+PREFIX = "cfai_publications"
+
+
+def synthetic_listing(blobs):
+    """<prefix>/<title>/<title>.pdf plus a .png or .jpg cover, like upload_to_gcs writes."""
+    rng = random.Random(0)
+    titles, files = [], {}
+    while len(files) < blobs:
+        title = f"Research Foundation Brief {len(titles)}: Risk & Return (Vol. {rng.randint(1, 40)})"
+        titles.append(title)
+        cover = "png" if rng.random() < 0.7 else "jpg"
+        for name in (f"{PREFIX}/{title}/{title}.pdf", f"{PREFIX}/{title}/{title}.{cover}"):
+            files[name] = f"gs://bucket/{name}"
+    return titles, dict(sorted(files.items()))
+
+
+def linear_match(title, gcs_files):
+    """What create_table_and_load_data did before TitleIndex"""
+    norm_title = normalize_title(title)
+    pdf_link = next((link for file_name, link in gcs_files.items()
+                     if norm_title in normalize_title(file_name) and
+                     (file_name.endswith(".pdf") or
+                      ("publications" in file_name.lower() and not file_name.endswith((".jpg", ".png"))))),
+                    None)
+    image_link = next((link for file_name, link in gcs_files.items()
+                       if norm_title in normalize_title(file_name) and file_name.endswith(".png")), None)
+    if not image_link:
+        image_link = next((link for file_name, link in gcs_files.items()
+                           if norm_title in normalize_title(file_name) and file_name.endswith(".jpg")), None)
+    return pdf_link, image_link
+
+
+if __name__ == "__main__":
+    titles, gcs_files = synthetic_listing(BLOBS)
+    sample = random.Random(1).sample(titles, min(SAMPLE, len(titles)))
+    print(f"{len(gcs_files)} blobs, {len(titles)} publications")
+
+    started = time.perf_counter()
+    expected = [linear_match(title, gcs_files) for title in sample]
+    per_title = (time.perf_counter() - started) / len(sample)
+    print(f"{'linear scans':<22} {per_title * 1000:9.2f} ms/title  ~{per_title * len(titles):9.1f}s for all titles (extrapolated)")
+
+    started = time.perf_counter()
+    title_index = TitleIndex(gcs_files)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    matches = [title_index.match(title) for title in titles]
+    lookups = time.perf_counter() - started
+    print(f"{'TitleIndex':<22} {build:9.2f}s build  {lookups * 1000:9.2f} ms for all titles")
+
+    # Titles with no blob of their own take the substring fallback; the first one builds its trigram postings
+    missing = [f"Research Foundation Brief {len(titles) + i}: Risk & Return" for i in range(SAMPLE)]
+    started = time.perf_counter()
+    title_index.match(missing[0])
+    print(f"{'TitleIndex first miss':<22} {time.perf_counter() - started:9.2f}s")
+    started = time.perf_counter()
+    for title in missing[1:]:
+        title_index.match(title)
+    print(f"{'TitleIndex misses':<22} {(time.perf_counter() - started) * 1000 / max(1, len(missing) - 1):9.2f} ms/title")
+
+    by_title = dict(zip(titles, matches))
+    mismatches = sum(by_title[title] != links for title, links in zip(sample, expected))
+    print(f"sampled titles whose links differ: {mismatches}")
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Download stage: parallel transfers, attempts per file, and streaming chunk size
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', '8'))
+DOWNLOAD_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', '4'))
+DOWNLOAD_BACKOFF = float(os.getenv('DOWNLOAD_BACKOFF', '1.0'))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', str(1 << 18)))
+DOWNLOAD_TIMEOUT = (10, float(os.getenv('DOWNLOAD_READ_TIMEOUT', '60')))
+
+# download_asset outcomes; only FAILED means the local copy may be missing or stale
+DOWNLOADED = 'downloaded'
+NOT_MODIFIED = 'not_modified'
+UNCHANGED = 'unchanged'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+DownloadResult = namedtuple('DownloadResult', ['status', 'file_path', 'validators'])
+
+# An unfinished transfer: the bytes so far, and the validators of the response they came from
+PART_SUFFIX = '.part'
+PART_STATE_SUFFIX = PART_SUFFIX + '.json'
+PARTIAL_SUFFIXES = (PART_SUFFIX, PART_STATE_SUFFIX)
+
+def create_session(pool_size=DOWNLOAD_CONCURRENCY):
+    """Session with a connection pool per host and urllib3 retries on connect errors and 429/5xx."""
+    retry = Retry(
+        total=DOWNLOAD_RETRIES,
+        backoff_factor=DOWNLOAD_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _hash_prefix(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest
+
+def _state_path(part_path):
+    return part_path[:-len(PART_SUFFIX)] + PART_STATE_SUFFIX
+
+def _discard_partial(part_path):
+    for path in (part_path, _state_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _resumable(validators):
+    return bool(validators and (validators.get('etag') or validators.get('last_modified')))
+
+def _load_partial(part_path, url):
+    """Validators saved with a .part file left by an earlier call or run; discards a part that cannot be resumed."""
+    state_path = _state_path(part_path)
+    validators = None
+    if os.path.exists(part_path) and os.path.exists(state_path):
+        try:
+            with open(state_path, encoding='utf-8') as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            validators = None
+    if validators and validators.get('url') == url and _resumable(validators):
+        return validators
+    _discard_partial(part_path)
+    return None
+
+def _save_partial(part_path, validators):
+    """Record which response the .part file holds; without validators it cannot be resumed, so record nothing."""
+    state_path = _state_path(part_path)
+    if _resumable(validators):
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(validators, f)
+    elif os.path.exists(state_path):
+        os.remove(state_path)
+
+def download_asset(session, url, download_folder, filename, previous=None):
+    """Stream url to download_folder/filename; returns a DownloadResult.
+
+    status is DOWNLOADED with the new file_path, NOT_MODIFIED when the server
+    answered 304 to the previous ETag/Last-Modified, UNCHANGED when the
+    content hashes the same, SKIPPED when there is no URL, and FAILED once
+    the retries are used up; validators are the previous ones unless the
+    server sent the file.
+
+    Bytes go to a .part file in chunks, with the response's ETag and
+    Last-Modified saved beside it. An interrupted transfer, in this call or
+    a later run, resumes with a Range request guarded by If-Range; attempts
+    back off. A part whose validators are missing or belong to another URL
+    is discarded and the download starts over.
+    """
+    previous = original = previous or {}
+    if not url or url == 'N/A':
+        return DownloadResult(SKIPPED, None, previous)
+    if previous.get('url') != url:
+        # Validators from another URL say nothing about this one
+        previous = {'sha256': previous.get('sha256')}
+
+    if not os.path.exists(download_folder):
+        os.makedirs(download_folder)
+    file_path = os.path.join(download_folder, filename.replace('/', '-'))
+    part_path = file_path + PART_SUFFIX
+    validators = _load_partial(part_path, url)
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        headers = {}
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and _resumable(validators):
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = validators['etag'] or validators['last_modified']
+        elif validators is None:
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+        try:
+            logger.info(f"Downloading: {url}" + (f" from byte {offset}" if 'Range' in headers else ""))
+            with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 304:
+                    logger.info(f"Not modified: {url}")
+                    return DownloadResult(NOT_MODIFIED, None, previous)
+                response.raise_for_status()
+                if validators is None or response.status_code == 200:
+                    validators = {
+                        'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')
+                    }
+                _save_partial(part_path, validators)
+                # 206 continues the partial file; a 200 means the server sent everything again
+                resume = response.status_code == 206 and 'Range' in headers
+                digest = _hash_prefix(part_path) if resume else hashlib.sha256()
+                with open(part_path, 'ab' if resume else 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        file.write(chunk)
+                        digest.update(chunk)
+            validators['sha256'] = digest.hexdigest()
+            if validators['sha256'] == previous.get('sha256'):
+                _discard_partial(part_path)
+                logger.info(f"Unchanged content: {url}")
+                return DownloadResult(UNCHANGED, None, validators)
+            os.replace(part_path, file_path)
+            _discard_partial(part_path)
+            logger.info(f"Downloaded: {file_path}")
+            return DownloadResult(DOWNLOADED, file_path, validators)
+        except requests.HTTPError as e:
+            # 429 and 5xx were already retried by the session's adapter
+            logger.error(f"Failed to download {url}: {e}")
+            validators = None
+            break
+        except Exception as e:
+            if attempt == DOWNLOAD_RETRIES:
+                logger.error(f"Failed to download {url}: {e}")
+                break
+            delay = DOWNLOAD_BACKOFF * (2 ** attempt)
+            logger.warning(f"Download of {url} interrupted ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    if not _resumable(validators):
+        _discard_partial(part_path)
+    return DownloadResult(FAILED, None, original)
+
+class AssetDownloader:
+    """Download stage run alongside the scraper: submit() queues a transfer and returns at once.
+
+    Transfers share one pooled session and at most `concurrency` run at a
+    time. Use as a context manager; leaving it waits for every transfer.
+    """
+
+    def __init__(self, concurrency=DOWNLOAD_CONCURRENCY):
+        self.session = create_session(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='asset-download')
+
+    def submit(self, url, download_folder, filename, previous=None):
+        """Future resolving to download_asset's DownloadResult."""
+        return self._executor.submit(download_asset, self.session, url, download_folder, filename, previous)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
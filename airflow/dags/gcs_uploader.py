@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import storage
+
+try:
+    import google_crc32c
+    CRC32C_SUPPORT = True
+except ImportError:
+    CRC32C_SUPPORT = False
+
+logger = logging.getLogger(__name__)
+
+# Upload stage: parallel uploads, and files at least RESUMABLE_THRESHOLD bytes go up in UPLOAD_CHUNK_SIZE chunks
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '8'))
+RESUMABLE_THRESHOLD = int(os.getenv('RESUMABLE_THRESHOLD', str(8 << 20)))
+# GCS requires chunk sizes in multiples of 256 KiB
+UPLOAD_CHUNK_SIZE = max(1, int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 << 20))) // (256 << 10)) * (256 << 10)
+# Attempts per file after the first, with exponential backoff between them
+UPLOAD_RETRIES = int(os.getenv('UPLOAD_RETRIES', '3'))
+UPLOAD_BACKOFF = float(os.getenv('UPLOAD_BACKOFF', '1.0'))
+
+class UploadError(Exception):
+    """Raised by upload_files once every file was tried; failures maps blob name -> last error."""
+
+    def __init__(self, failures, results):
+        self.failures = failures
+        self.results = results
+        super().__init__(f"{len(failures)} uploads failed: {', '.join(sorted(failures))}")
+
+def is_retryable(error):
+    """Client errors other than timeouts and rate limits (408/429) would fail the same way again."""
+    code = getattr(error, 'code', None)
+    return not (isinstance(code, int) and 400 <= code < 500 and code not in (408, 429))
+
+def local_checksums(path, block_size=1 << 20):
+    """Base64 MD5 and CRC32C of a file, in the encoding GCS reports for blobs."""
+    md5 = hashlib.md5()
+    crc32c = google_crc32c.Checksum() if CRC32C_SUPPORT else None
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            md5.update(block)
+            if crc32c is not None:
+                crc32c.update(block)
+    return (base64.b64encode(md5.digest()).decode('ascii'),
+            base64.b64encode(crc32c.digest()).decode('ascii') if crc32c is not None else None)
+
+def remote_checksums(bucket, prefix):
+    """blob name -> (md5_hash, crc32c) for everything under prefix, from one listing."""
+    return {blob.name: (blob.md5_hash, blob.crc32c) for blob in bucket.list_blobs(prefix=prefix)}
+
+def is_unchanged(path, remote):
+    """Compare by MD5, or by CRC32C for composite objects, which have no MD5."""
+    if not remote:
+        return False
+    md5_hash, crc32c = local_checksums(path)
+    if remote[0]:
+        return remote[0] == md5_hash
+    return bool(remote[1]) and remote[1] == crc32c
+
+def upload_file(bucket, local_path, blob_name):
+    """Upload one file, retrying with backoff unless the error is a client error.
+
+    Large files use a chunked resumable upload, so a dropped connection resends one chunk, not the file.
+    """
+    chunk_size = UPLOAD_CHUNK_SIZE if os.path.getsize(local_path) >= RESUMABLE_THRESHOLD else None
+    for attempt in range(UPLOAD_RETRIES + 1):
+        try:
+            bucket.blob(blob_name, chunk_size=chunk_size).upload_from_filename(local_path)
+            return
+        except Exception as e:
+            if attempt == UPLOAD_RETRIES or not is_retryable(e):
+                raise
+            delay = UPLOAD_BACKOFF * (2 ** attempt)
+            logger.warning(f"Upload of {blob_name} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def upload_files(bucket_name, uploads, prefix, client=None):
+    """Upload (local_path, blob_name) pairs in parallel, skipping files whose checksum matches the blob.
+
+    Returns blob name -> True if it was uploaded, False if it was already current.
+    A failing file does not stop the others; once all were tried, UploadError
+    reports every file that still failed after its retries.
+    """
+    client = client or storage.Client()
+    bucket = client.bucket(bucket_name)
+    existing = remote_checksums(bucket, prefix)
+
+    def upload(item):
+        local_path, blob_name = item
+        try:
+            if is_unchanged(local_path, existing.get(blob_name)):
+                return blob_name, False, None
+            upload_file(bucket, local_path, blob_name)
+            return blob_name, True, None
+        except Exception as e:
+            logger.error(f"Failed to upload {local_path} to {blob_name}: {e}")
+            return blob_name, None, e
+
+    results, failures = {}, {}
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix='gcs-upload') as executor:
+        for blob_name, uploaded, error in executor.map(upload, uploads):
+            if error is None:
+                results[blob_name] = uploaded
+            else:
+                failures[blob_name] = error
+    uploaded = sum(results.values())
+    logger.info(f"Uploaded {uploaded} files to gs://{bucket_name}/{prefix}, "
+                f"{len(results) - uploaded} unchanged, {len(failures)} failed")
+    if failures:
+        raise UploadError(failures, results)
+    return results
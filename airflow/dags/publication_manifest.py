@@ -0,0 +1,37 @@
+import hashlib
+import json
+import logging
+import os
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+# Seen publications, kept next to cfa_publications.json in the bucket
+MANIFEST_BLOB_NAME = os.getenv('MANIFEST_BLOB_NAME', 'cfai_publications/manifest.json')
+
+def load_manifest(bucket_name):
+    """Title -> manifest entry, or {} before the first run.
+
+    An entry holds the listing 'fingerprint', the validators download_asset
+    returned per file ('pdf', 'image'), the last published 'record', and the
+    'row_hash' of the row last loaded into Snowflake.
+    """
+    blob = storage.Client().bucket(bucket_name).blob(MANIFEST_BLOB_NAME)
+    if not blob.exists():
+        return {}
+    return json.loads(blob.download_as_text())
+
+def save_manifest(bucket_name, manifest):
+    blob = storage.Client().bucket(bucket_name).blob(MANIFEST_BLOB_NAME)
+    blob.upload_from_string(json.dumps(manifest, ensure_ascii=False), content_type="application/json")
+    logger.info(f"Saved manifest with {len(manifest)} publications to gs://{bucket_name}/{MANIFEST_BLOB_NAME}")
+
+def _sha256(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+def listing_fingerprint(*fields):
+    """Hash of what the listing page shows for a publication; a change means it needs a full visit."""
+    return _sha256(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+
+def row_hash(row):
+    return _sha256(json.dumps(list(row), ensure_ascii=False).encode("utf-8"))
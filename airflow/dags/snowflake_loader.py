@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+from datetime import datetime
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+# External stage created by create_or_replace_snowflake_resources over stage_url(BUCKET_NAME), JSON format
+SNOWFLAKE_STAGE = 'my_gcs_stage'
+SNOWFLAKE_FILE_FORMAT = 'my_json_format'
+# Where load batches are written in the bucket behind the stage
+STAGE_LOAD_PREFIX = os.getenv('STAGE_LOAD_PREFIX', 'cfai_publications/snowflake_loads')
+
+PUBLICATIONS_COLUMNS = ("title", "summary", "image_link", "pdf_link")
+PUBLICATIONS_DDL = """(
+    title STRING,
+    summary STRING,
+    image_link STRING,
+    pdf_link STRING
+)"""
+
+def stage_url(bucket_name):
+    """URL of the bucket the stage reads; batches written to bucket_name are only visible to COPY through it."""
+    return f"gcs://{bucket_name}/"
+
+def write_batch_to_stage(bucket_name, rows, columns, name):
+    """Upload rows as newline-delimited JSON under STAGE_LOAD_PREFIX; returns the stage-relative path."""
+    blob_name = f"{STAGE_LOAD_PREFIX}/{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.json"
+    payload = "\n".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) for row in rows)
+    client = storage.Client()
+    client.bucket(bucket_name).blob(blob_name).upload_from_string(payload, content_type="application/x-ndjson")
+    return blob_name
+
+def delete_staged_batch(bucket_name, blob_name):
+    try:
+        storage.Client().bucket(bucket_name).blob(blob_name).delete()
+    except Exception as e:
+        logger.warning(f"Could not delete staged batch {blob_name}: {e}")
+
+def copy_rows_into(cursor, table, rows, columns, bucket_name):
+    """Load rows into table with one COPY INTO from the stage; returns how many rows were loaded.
+
+    The stage is external, so the batch is written to its bucket directly
+    (PUT only works for internal stages) and removed again afterwards.
+    """
+    blob_name = write_batch_to_stage(bucket_name, rows, columns, table.lower())
+    try:
+        cursor.execute(f"""
+        COPY INTO {table}
+        FROM @{SNOWFLAKE_STAGE}/{blob_name}
+        FILE_FORMAT = (FORMAT_NAME = '{SNOWFLAKE_FILE_FORMAT}')
+        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+        ON_ERROR = ABORT_STATEMENT;
+        """)
+        cursor.execute(f"SELECT COUNT(*) FROM {table};")
+        return cursor.fetchone()[0]
+    finally:
+        delete_staged_batch(bucket_name, blob_name)
+
+def insert_rows_into(cursor, table, rows, columns):
+    """Fallback: one executemany, which the connector sends as batched multi-row INSERTs."""
+    placeholders = ", ".join(["%s"] * len(columns))
+    cursor.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});",
+        [tuple(row) for row in rows]
+    )
+
+def bulk_load(cursor, table, rows, columns, bucket_name):
+    """Load rows into an empty table: staged COPY INTO, or executemany if staging fails or loads short."""
+    rows = list(rows)
+    if not rows:
+        return "empty"
+    try:
+        loaded = copy_rows_into(cursor, table, rows, columns, bucket_name)
+        if loaded == len(rows):
+            return "copy"
+        if loaded == 0:
+            logger.error(
+                f"COPY INTO {table} loaded no rows: @{SNOWFLAKE_STAGE} does not seem to read "
+                f"{stage_url(bucket_name)}; recreate it with create_or_replace_snowflake_resources"
+            )
+        logger.warning(f"COPY INTO {table} loaded {loaded} of {len(rows)} rows; falling back to executemany")
+    except Exception as e:
+        logger.warning(f"Staged load into {table} failed, falling back to executemany: {e}")
+    cursor.execute(f"TRUNCATE TABLE IF EXISTS {table};")
+    insert_rows_into(cursor, table, rows, columns)
+    return "executemany"
+
+def merge_rows(cursor, table, key, ddl, rows, columns, bucket_name):
+    """Upsert rows into table on key: bulk load them into a temporary table, then run one MERGE."""
+    rows = list(rows)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} {ddl};")
+    if not rows:
+        return "unchanged"
+    changes = f"{table}_changes"
+    cursor.execute(f"CREATE OR REPLACE TEMPORARY TABLE {changes} {ddl};")
+    try:
+        method = bulk_load(cursor, changes, rows, columns, bucket_name)
+        updates = ", ".join(f"target.{column} = source.{column}" for column in columns if column != key)
+        cursor.execute(f"""
+        MERGE INTO {table} AS target
+        USING {changes} AS source
+        ON target.{key} = source.{key}
+        WHEN MATCHED THEN UPDATE SET {updates}
+        WHEN NOT MATCHED THEN INSERT ({', '.join(columns)})
+        VALUES ({', '.join(f'source.{column}' for column in columns)});
+        """)
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {changes};")
+    return f"merge ({method})"
+
+def replace_table_atomically(cursor, table, ddl, rows, columns, bucket_name):
+    """Bulk load rows into a shadow table, then SWAP it with table so readers never see a partial load."""
+    shadow = f"{table}_shadow"
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} {ddl};")
+    cursor.execute(f"CREATE OR REPLACE TABLE {shadow} {ddl};")
+    try:
+        method = bulk_load(cursor, shadow, rows, columns, bucket_name)
+        cursor.execute(f"ALTER TABLE {shadow} SWAP WITH {table};")
+    finally:
+        # After the swap this holds the previous contents; before it, a partial load
+        cursor.execute(f"DROP TABLE IF EXISTS {shadow};")
+    return method
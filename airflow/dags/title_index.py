@@ -0,0 +1,115 @@
+import os
+import re
+from array import array
+from urllib.parse import unquote
+
+def normalize_title(title):
+    """Normalize title by removing special characters for matching."""
+    if not title:
+        return ""
+    # Decode any URL-encoded characters
+    decoded_title = unquote(title)
+    # Remove special characters and normalize spacing
+    normalized = re.sub(r'[^\w\s]', '', decoded_title).replace(' ', '').lower()
+    return normalized
+
+def blob_kind(file_name):
+    """Which link a blob can supply: 'pdf', 'png', 'jpg' or None."""
+    if file_name.endswith(".png"):
+        return "png"
+    if file_name.endswith(".jpg"):
+        return "jpg"
+    if file_name.endswith(".jpeg"):
+        return None
+    # Anything else under the publications prefix is a PDF candidate, as before
+    if file_name.endswith(".pdf") or "publications" in file_name.lower():
+        return "pdf"
+    return None
+
+# Length of the substrings indexed for the substring fallback
+GRAM = 3
+# The links match() fills: a PDF, and an image from a PNG or else a JPG
+LINK_KINDS = (("pdf",), ("png", "jpg"))
+
+class TitleIndex:
+    """Normalized title -> candidate PDF and image links, built once from list_gcs_files().
+
+    upload_to_gcs stores each publication as <prefix>/<title>/<title>.<ext>,
+    so every path component (extension stripped) is indexed and a title is
+    found with one dict lookup. Candidates keep bucket listing order, so the
+    first link per kind is the one the old linear scans returned. A link the
+    exact match does not supply falls back to the old substring match, which
+    only checks the blobs sharing the title's rarest trigram.
+    """
+
+    def __init__(self, gcs_files):
+        self._index = {}
+        self._normalized = []
+        # trigram -> positions in _normalized of the blob names containing it; built on first fallback
+        self._grams = None
+        for file_name, link in gcs_files.items():
+            kind = blob_kind(file_name)
+            if kind is None:
+                continue
+            norm_name = normalize_title(file_name)
+            self._normalized.append((norm_name, kind, link))
+            stem, _ = os.path.splitext(file_name)
+            for key in {normalize_title(part) for part in stem.split('/')}:
+                if key:
+                    self._index.setdefault(key, {}).setdefault(kind, []).append(link)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _build_grams(self):
+        self._grams = {}
+        for position, (norm_name, _, _) in enumerate(self._normalized):
+            for gram in {norm_name[i:i + GRAM] for i in range(len(norm_name) - GRAM + 1)}:
+                positions = self._grams.get(gram)
+                if positions is None:
+                    positions = self._grams[gram] = array('I')
+                positions.append(position)
+
+    def _substring_matches(self, norm_title):
+        """Links per kind of blobs whose normalized name contains norm_title, in listing order."""
+        if len(norm_title) < GRAM:
+            positions = range(len(self._normalized))
+        else:
+            if self._grams is None:
+                self._build_grams()
+            # Every match contains each trigram of the title, so the rarest one bounds the scan
+            positions = min(
+                (self._grams.get(norm_title[i:i + GRAM], ()) for i in range(len(norm_title) - GRAM + 1)),
+                key=len
+            )
+        found = {}
+        for position in positions:
+            norm_name, kind, link = self._normalized[position]
+            if norm_title in norm_name:
+                found.setdefault(kind, []).append(link)
+        return found
+
+    def candidates(self, title):
+        """Links per kind for a title, in listing order.
+
+        Exact path-component matches win; the PDF or image link they lack is
+        taken from the substring matches.
+        """
+        norm_title = normalize_title(title)
+        found = dict(self._index.get(norm_title, {}))
+        missing = [kinds for kinds in LINK_KINDS if not any(kind in found for kind in kinds)]
+        if missing:
+            matches = self._substring_matches(norm_title)
+            for kinds in missing:
+                for kind in kinds:
+                    if kind in matches:
+                        found[kind] = matches[kind]
+        return found
+
+    def match(self, title):
+        """(pdf_link, image_link) for a title; PNG images are preferred over JPG."""
+        found = self.candidates(title)
+        pdf_links = found.get("pdf")
+        image_links = found.get("png") or found.get("jpg")
+        return (pdf_links[0] if pdf_links else None,
+                image_links[0] if image_links else None)
@@ -0,0 +1,273 @@
+"""Tests for the parallel GCS upload stage, run against an in-memory stand-in for a bucket.
+
+Run from the airflow directory:
+
+    python -m pytest tests
+"""
+import base64
+import hashlib
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags'))
+
+try:
+    from google.cloud import storage  # noqa: F401
+except ImportError:
+    # upload_files only touches storage.Client when no client is passed in
+    google = sys.modules.setdefault('google', types.ModuleType('google'))
+    cloud = sys.modules.setdefault('google.cloud', types.ModuleType('google.cloud'))
+    storage = types.ModuleType('google.cloud.storage')
+    storage.Client = None
+    sys.modules['google.cloud.storage'] = storage
+    google.cloud = cloud
+    cloud.storage = storage
+
+import gcs_uploader
+from gcs_uploader import UploadError, upload_files
+
+
+def crc32c(data):
+    """Reference CRC32C (Castagnoli), independent of google_crc32c."""
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0x82F63B78 if crc & 1 else 0)
+    return crc ^ 0xFFFFFFFF
+
+
+class FakeChecksum:
+    """The part of google_crc32c.Checksum that local_checksums uses."""
+
+    def __init__(self):
+        self._data = b''
+
+    def update(self, block):
+        self._data += block
+
+    def digest(self):
+        return crc32c(self._data).to_bytes(4, 'big')
+
+
+class ApiError(Exception):
+    """Stands in for google.api_core exceptions, which carry the HTTP status as .code."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeBlob:
+    def __init__(self, bucket, name, chunk_size=None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+
+    def upload_from_filename(self, path):
+        bucket = self.bucket
+        with bucket.lock:
+            bucket.calls.append(self.name)
+            bucket.active += 1
+            bucket.max_active = max(bucket.max_active, bucket.active)
+            errors = bucket.errors.get(self.name)
+            error = errors.pop(0) if errors else None
+        try:
+            # Long enough for the other workers to start their uploads
+            time.sleep(bucket.latency)
+            if error is not None:
+                raise error
+            with open(path, 'rb') as f:
+                data = f.read()
+            with bucket.lock:
+                bucket.objects[self.name] = data
+                bucket.chunk_sizes[self.name] = self.chunk_size
+        finally:
+            with bucket.lock:
+                bucket.active -= 1
+
+
+class FakeBucket:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.chunk_sizes = {}
+        # blob name -> exceptions raised by its next uploads, in order
+        self.errors = {}
+        # Composite objects have a CRC32C but no MD5
+        self.composite = set()
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.latency = 0.02
+
+    def blob(self, name, chunk_size=None):
+        return FakeBlob(self, name, chunk_size)
+
+    def list_blobs(self, prefix=None):
+        for name, data in sorted(self.objects.items()):
+            if prefix and not name.startswith(prefix):
+                continue
+            md5_hash = None if name in self.composite else base64.b64encode(hashlib.md5(data).digest()).decode('ascii')
+            yield types.SimpleNamespace(
+                name=name,
+                md5_hash=md5_hash,
+                crc32c=base64.b64encode(crc32c(data).to_bytes(4, 'big')).decode('ascii')
+            )
+
+
+class FakeClient:
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name):
+        return self.fake_bucket
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gcs_uploader, 'UPLOAD_BACKOFF', 0.0)
+
+
+@pytest.fixture
+def publications(tmp_path):
+    """Eight small files laid out the way upload_to_gcs names them."""
+    uploads = []
+    for i in range(8):
+        path = tmp_path / f"publication-{i}.pdf"
+        path.write_bytes(f"publication {i}".encode() * 50)
+        uploads.append((str(path), f"cfai_publications/Publication {i}/publication-{i}.pdf"))
+    return uploads
+
+
+def test_uploads_new_files_then_skips_them_by_md5(client, publications):
+    results = upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert results == {blob_name: True for _, blob_name in publications}
+    assert set(client.fake_bucket.objects) == {blob_name for _, blob_name in publications}
+
+    client.fake_bucket.calls.clear()
+    results = upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert results == {blob_name: False for _, blob_name in publications}
+    assert client.fake_bucket.calls == []
+
+
+def test_changed_file_is_uploaded_again(client, publications):
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+    changed_path, changed_blob = publications[3]
+    with open(changed_path, 'wb') as f:
+        f.write(b'revised edition')
+    client.fake_bucket.calls.clear()
+
+    results = upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert client.fake_bucket.calls == [changed_blob]
+    assert [blob_name for blob_name, uploaded in results.items() if uploaded] == [changed_blob]
+    assert client.fake_bucket.objects[changed_blob] == b'revised edition'
+
+
+def test_composite_objects_are_compared_by_crc32c(client, publications, monkeypatch):
+    monkeypatch.setattr(gcs_uploader, 'CRC32C_SUPPORT', True)
+    monkeypatch.setattr(gcs_uploader, 'google_crc32c', types.SimpleNamespace(Checksum=FakeChecksum), raising=False)
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+    client.fake_bucket.composite.update(blob_name for _, blob_name in publications)
+    changed_path, changed_blob = publications[0]
+    with open(changed_path, 'wb') as f:
+        f.write(b'revised edition')
+    client.fake_bucket.calls.clear()
+
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert client.fake_bucket.calls == [changed_blob]
+
+
+def test_composite_objects_are_uploaded_without_crc32c_support(client, publications, monkeypatch):
+    monkeypatch.setattr(gcs_uploader, 'CRC32C_SUPPORT', False)
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+    client.fake_bucket.composite.update(blob_name for _, blob_name in publications)
+    client.fake_bucket.calls.clear()
+
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert sorted(client.fake_bucket.calls) == sorted(blob_name for _, blob_name in publications)
+
+
+def test_uploads_run_in_parallel(client, publications, monkeypatch):
+    monkeypatch.setattr(gcs_uploader, 'UPLOAD_CONCURRENCY', 4)
+    client.fake_bucket.latency = 0.1
+
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert 1 < client.fake_bucket.max_active <= 4
+
+
+def test_large_files_use_chunked_uploads(client, publications, monkeypatch):
+    monkeypatch.setattr(gcs_uploader, 'RESUMABLE_THRESHOLD', 1000)
+    large_path, large_blob = publications[0]
+    with open(large_path, 'wb') as f:
+        f.write(b'x' * 2000)
+
+    upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert client.fake_bucket.chunk_sizes[large_blob] == gcs_uploader.UPLOAD_CHUNK_SIZE
+    assert client.fake_bucket.chunk_sizes[publications[1][1]] is None
+
+
+def test_transient_errors_are_retried(client, publications):
+    _, flaky_blob = publications[2]
+    client.fake_bucket.errors[flaky_blob] = [ApiError(503), ConnectionError('reset by peer')]
+
+    results = upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert results[flaky_blob] is True
+    assert client.fake_bucket.calls.count(flaky_blob) == 3
+
+
+def test_upload_gives_up_after_retries(client, publications, monkeypatch):
+    monkeypatch.setattr(gcs_uploader, 'UPLOAD_RETRIES', 2)
+    _, failing_blob = publications[5]
+    client.fake_bucket.errors[failing_blob] = [ApiError(503)] * 5
+
+    with pytest.raises(UploadError) as raised:
+        upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert list(raised.value.failures) == [failing_blob]
+    assert client.fake_bucket.calls.count(failing_blob) == 3
+    # Every other file was still uploaded
+    assert raised.value.results == {blob_name: True for _, blob_name in publications if blob_name != failing_blob}
+
+
+def test_client_errors_are_not_retried(client, publications):
+    _, forbidden_blob = publications[1]
+    _, missing_blob = publications[6]
+    client.fake_bucket.errors[forbidden_blob] = [ApiError(403)]
+    client.fake_bucket.errors[missing_blob] = [ApiError(404)]
+
+    with pytest.raises(UploadError) as raised:
+        upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert set(raised.value.failures) == {forbidden_blob, missing_blob}
+    assert raised.value.failures[forbidden_blob].code == 403
+    assert client.fake_bucket.calls.count(forbidden_blob) == 1
+    assert client.fake_bucket.calls.count(missing_blob) == 1
+
+
+def test_rate_limits_are_retried(client, publications):
+    _, throttled_blob = publications[4]
+    client.fake_bucket.errors[throttled_blob] = [ApiError(429)]
+
+    results = upload_files('bucket', publications, 'cfai_publications/', client=client)
+
+    assert results[throttled_blob] is True
+    assert client.fake_bucket.calls.count(throttled_blob) == 2
@@ -1,5 +1,4 @@
 import os
-import requests
 import logging
 import re
 import json
@@ -12,6 +11,8 @@ from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup as bs
 from google.cloud import storage
 import urllib.parse
+from dags.asset_downloader import PARTIAL_SUFFIXES, AssetDownloader, create_session, download_asset
+from dags.gcs_uploader import upload_files
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,23 +36,9 @@ def extract_detail_data(driver):
     return pdf_link
 
 def download_file(url, download_folder, filename):
-    if url and url != 'N/A':
-        try:
-            logger.info(f"Downloading: {url}")
-            response = requests.get(url)
-            response.raise_for_status()
-            if not os.path.exists(download_folder):
-                os.makedirs(download_folder)
-            safe_filename = filename.replace('/', '-')
-            file_path = os.path.join(download_folder, safe_filename)
-            with open(file_path, 'wb') as file:
-                file.write(response.content)
-            logger.info(f"Downloaded: {file_path}")
-            return file_path
-        except Exception as e:
-            logger.error(f"Failed to download {url}: {e}")
-            return None
-    return None
+    """Stream one file to disk with retries; the scraper itself queues files on an AssetDownloader."""
+    with create_session(1) as session:
+        return download_asset(session, url, download_folder, filename).file_path
 
 def clean_filename(filename):
     return re.sub(r'\?.*$', '', filename)
@@ -60,35 +47,38 @@ def generate_authenticated_url(bucket_name, destination_blob_name):
     """Generate an authenticated URL for GCS."""
     return f"https://storage.googleapis.com/{bucket_name}/{urllib.parse.quote(destination_blob_name)}"
 
-def upload_to_gcs(bucket_name, source_folder, destination_blob_name):
-    """Uploads specific folders to a GCS bucket and returns URLs for the uploaded files."""
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
+def upload_to_gcs(bucket_name, source_folder, destination_blob_name, folders=None):
+    """Uploads specific folders to a GCS bucket and returns URLs for the uploaded files.
 
+    folders limits the upload to those publication folders; None uploads all of them.
+    Files whose checksum matches the blob already in the bucket are not uploaded again.
+    """
     # Define folders to exclude (e.g., venv)
     exclude_dirs = {'venv', '__pycache__', '.git','dags', 'logs'}
     publication_links = {}
+    uploads = []
 
-    # Upload each publication folder, excluding any irrelevant folders
-    for publication_folder in os.listdir(source_folder):
+    # Collect each publication folder, excluding any irrelevant folders
+    for publication_folder in sorted(folders) if folders is not None else os.listdir(source_folder):
         folder_path = os.path.join(source_folder, publication_folder)
 
-        if os.path.isdir(folder_path) and publication_folder not in exclude_dirs:
+        if os.path.isdir(folder_path) and publication_folder not in exclude_dirs and not publication_folder.startswith('.'):
             pdf_gcs_link = None
             image_gcs_link = None
 
-            # Upload files and capture GCS links
+            # Queue files and capture GCS links
             for dirpath, _, filenames in os.walk(folder_path):
                 for filename in filenames:
+                    # Transfers the download stage did not finish
+                    if filename.endswith(PARTIAL_SUFFIXES):
+                        continue
                     # File paths and cleaned name
                     local_file_path = os.path.join(dirpath, filename)
                     clean_name = clean_filename(filename)
                     relative_path = os.path.relpath(os.path.join(dirpath, clean_name), source_folder)
-                    blob = bucket.blob(os.path.join(destination_blob_name, relative_path))
-
-                    # Upload file
-                    blob.upload_from_filename(local_file_path)
-                    gcs_link = generate_authenticated_url(bucket_name, os.path.join(destination_blob_name, relative_path))
+                    blob_name = os.path.join(destination_blob_name, relative_path)
+                    uploads.append((local_file_path, blob_name))
+                    gcs_link = generate_authenticated_url(bucket_name, blob_name)
 
                     # Store GCS link based on file type
                     if clean_name.endswith('.pdf'):
@@ -102,6 +92,8 @@ def upload_to_gcs(bucket_name, source_folder, destination_blob_name):
                 "image_gcs_link": image_gcs_link
             }
 
+    # Upload in parallel, skipping unchanged files
+    upload_files(bucket_name, uploads, destination_blob_name.rstrip('/') + '/')
     return publication_links
 
 def upload_json_to_gcs(bucket_name, json_file_name, destination_blob_name):
@@ -124,6 +116,10 @@ def scrape_publications():
     all_data = []
     seen_titles = set()
     publication_index = 1
+    # Files download in the background while Selenium keeps paging
+    downloader = AssetDownloader()
+    downloads = []
+    publication_folders = set()
 
     try:
         driver.get("https://rpc.cfainstitute.org/en/research-foundation/publications#sort=%40officialz32xdate%20descending&f:SeriesContent=[Research%20Foundation]")
@@ -161,12 +157,13 @@ def scrape_publications():
                     WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CLASS_NAME, "grid__item--article-element")))
                     pdf_link = extract_detail_data(driver)
                     publication_folder = clean_title(title)
+                    publication_folders.add(publication_folder)
                     if not os.path.exists(publication_folder):
                         os.makedirs(publication_folder)
-                    download_file(pdf_link, publication_folder, f"{title}.pdf")
+                    downloads.append(downloader.submit(pdf_link, publication_folder, f"{title}.pdf"))
                     if image_src != 'N/A':
                         file_extension = image_src.split('.')[-1]
-                        download_file(image_src, publication_folder, f"{title}.{file_extension}")
+                        downloads.append(downloader.submit(image_src, publication_folder, f"{title}.{file_extension}"))
                     driver.back()
                     WebDriverWait(driver, 20).until(EC.presence_of_all_elements_located((By.CLASS_NAME, "RPCAllsiteSearchResultList")))
                 
@@ -193,8 +190,12 @@ def scrape_publications():
                 logger.error(f"Error navigating to the next page: {e}")
                 break
 
+        # Wait for the download stage before uploading
+        for future in downloads:
+            future.result()
+
         # Upload files to GCS and get their links
-        publication_links = upload_to_gcs(gcs_bucket_name, '.', gcs_path)
+        publication_links = upload_to_gcs(gcs_bucket_name, '.', gcs_path, folders=publication_folders)
 
         # Append GCS links to JSON data
         for item in all_data:
@@ -218,6 +219,7 @@ def scrape_publications():
         logger.error(f"An error occurred: {e}")
     finally:
         driver.quit()
+        downloader.close()
 
 if __name__ == "__main__":
     scrape_publications()
@@ -1,12 +1,17 @@
+import asyncio
+import json
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from snowflake.connector import connect
 from google.cloud import storage
 from dotenv import load_dotenv
-import fitz  # PyMuPDF
 import os
-from openai import OpenAI
+from llm_client import API_KEY, TRITON_SERVER_URL, SUMMARY_MODEL, SUMMARY_PARAMS, SUMMARY_PROMPT_TEMPLATE, get_async_llm_client
+from pdf_text import extract_text
+from summary_cache import get_summary_cache, pdf_hash
 
 # Load environment variables
 load_dotenv()
@@ -26,13 +31,19 @@ SNOWFLAKE_WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE")
 SNOWFLAKE_DATABASE = os.getenv("SNOWFLAKE_DATABASE")
 SNOWFLAKE_SCHEMA = os.getenv("SNOWFLAKE_SCHEMA")
 
-# NVIDIA API configurations
-API_KEY = os.getenv("NVIDIA_API_KEY")
-TRITON_SERVER_URL = "https://integrate.api.nvidia.com/v1"
-
 # GCP configurations
 GCP_BUCKET_NAME = os.getenv("GCP_BUCKET_NAME")
 
+# /process-pdfs pipeline: workers per stage, and how many items may wait between stages
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", str(os.cpu_count() or 2)))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "16"))
+
+# Created on first use and kept for the life of the process, like the GCS client
+_extract_pool = None
+
+# NVIDIA API configurations come from llm_client
 if not API_KEY or not TRITON_SERVER_URL:
     logger.error("NVIDIA API_KEY or TRITON_SERVER_URL not found in environment variables")
     raise EnvironmentError("NVIDIA API_KEY or TRITON_SERVER_URL not found in environment variables")
@@ -69,63 +80,67 @@ def fetch_pdf_urls_from_snowflake(conn):
         logger.error(f"Error fetching PDF URLs: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching PDF URLs: {str(e)}")
 
+def _get_extract_pool():
+    global _extract_pool
+    if _extract_pool is None:
+        _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_CONCURRENCY)
+    return _extract_pool
+
+@lru_cache()
+def get_storage_client():
+    """One GCS client per process; it is thread-safe and keeps its connections open."""
+    return storage.Client()
+
 # Download a PDF from GCS
-def download_pdf_from_gcs(pdf_url, local_path):
-    """Download a PDF from GCS."""
+def download_pdf_from_gcs(pdf_url):
+    """Download a PDF from GCS into memory."""
     try:
         logger.info(f"Downloading PDF from GCS: {pdf_url}")
         if pdf_url.startswith("gs://"):
             pdf_url = pdf_url.replace("gs://", "", 1)
 
         bucket_name, object_key = pdf_url.split('/', 1)
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
+        bucket = get_storage_client().bucket(bucket_name)
         blob = bucket.blob(object_key)
-        blob.download_to_filename(local_path)
-        logger.info(f"Downloaded PDF to {local_path}")
+        pdf_bytes = blob.download_as_bytes()
+        logger.info(f"Downloaded {len(pdf_bytes)} bytes from {pdf_url}")
+        return pdf_bytes
     except Exception as e:
         logger.error(f"Error downloading PDF from GCS: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error downloading PDF from GCS: {str(e)}")
 
 # Extract text from a PDF using PyMuPDF
-def extract_text_from_pdf(pdf_path):
+def extract_text_from_pdf(pdf_source):
+    """Extract text from PDF bytes (or a path) without touching disk."""
     try:
-        logger.info(f"Extracting text from PDF: {pdf_path}")
-        with fitz.open(pdf_path) as doc:
-            text = ""
-            for page in doc:
-                text += page.get_text("text")
+        logger.info("Extracting text from PDF")
+        text = extract_text(pdf_source)
         logger.info("Successfully extracted text from PDF")
-        return text.strip()
+        return text
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {str(e)}")
 
-def generate_summary_from_text(extracted_text):
-    """Generate a summary using the NVIDIA model."""
+async def generate_summary_from_text(extracted_text):
+    """Generate a summary using the NVIDIA model, awaited on the event loop."""
     try:
         # Log the start of summary generation
         logger.info("Generating summary using NVIDIA API...")
         
-        # Create OpenAI client
-        openai_client = OpenAI(
-            base_url=TRITON_SERVER_URL,
-            api_key=API_KEY
-        )
+        # Shared async client: connections are pooled across calls
+        openai_client = get_async_llm_client()
 
         # Prepare prompt message
         prompt_message = [{
             'role': 'user',
-            'content': f"Summarize the following text in a concise way: \n{extracted_text}"
+            'content': SUMMARY_PROMPT_TEMPLATE.format(text=extracted_text)
         }]
 
         # Make completion request
-        completion_response = openai_client.chat.completions.create(
-            model="meta/llama-3.1-405b-instruct",
+        completion_response = await openai_client.chat.completions.create(
+            model=SUMMARY_MODEL,
             messages=prompt_message,
-            temperature=0.2,
-            top_p=0.7,
-            max_tokens=150,
+            **SUMMARY_PARAMS,
             stream=False
         )
 
@@ -145,41 +160,141 @@ def generate_summary_from_text(extracted_text):
         logger.error(f"Error generating summary: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
 
+def extract_text_in_worker(pdf_bytes):
+    """Extraction entry point for the process pool; returns (text, error) so nothing unpicklable crosses back."""
+    try:
+        return extract_text_from_pdf(pdf_bytes), None
+    except HTTPException as e:
+        return None, e.detail
+    except Exception as e:
+        return None, str(e)
+
+# Marks the end of a stage's input; each worker puts it back for its siblings
+_END = object()
+
+async def run_stage(inbox, outbox, workers, handle, results):
+    """Run `workers` copies of handle() over inbox, passing non-None outputs to outbox.
+
+    Queues are bounded, so a slow stage makes the ones before it wait instead
+    of piling up work in memory. Failures are reported to results per PDF.
+    """
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _END:
+                await inbox.put(_END)
+                return
+            try:
+                output = await handle(item)
+            except Exception as e:
+                logger.error(f"Error processing {item['pdf_url']}: {getattr(e, 'detail', str(e))}")
+                await results.put({"pdf_url": item["pdf_url"], "error": getattr(e, "detail", str(e))})
+                continue
+            if output is not None:
+                await outbox.put(output)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await outbox.put(_END)
+
+async def process_pdf_pipeline(pdf_urls):
+    """Download, extract and summarize PDFs in concurrent stages, yielding results as they finish."""
+    loop = asyncio.get_running_loop()
+    cache = get_summary_cache()
+    urls = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    downloaded = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    extracted = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    results = asyncio.Queue()
+
+    async def download(item):
+        pdf_bytes = await asyncio.to_thread(download_pdf_from_gcs, item["pdf_url"])
+        if cache is None:
+            return {**item, "pdf_bytes": pdf_bytes}
+
+        # Unchanged PDFs skip extraction and the model entirely
+        content_hash = pdf_hash(pdf_bytes)
+        summary = cache.get_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, SUMMARY_PARAMS)
+        if summary:
+            await results.put({"pdf_url": item["pdf_url"], "summary": summary})
+            return None
+        return {**item, "pdf_bytes": pdf_bytes, "content_hash": content_hash}
+
+    async def extract(item):
+        pdf_bytes = item.pop("pdf_bytes")
+        extracted_text = cache.get_text(item["content_hash"]) if cache is not None else None
+        if extracted_text is not None:
+            return {**item, "text": extracted_text} if extracted_text else None
+        extracted_text, error = await loop.run_in_executor(_get_extract_pool(), extract_text_in_worker, pdf_bytes)
+        if error:
+            raise Exception(error)
+        if cache is not None:
+            cache.put_text(item["content_hash"], extracted_text)
+        if not extracted_text:
+            logger.warning(f"No text found in PDF: {item['pdf_url']}")
+            return None
+        return {**item, "text": extracted_text}
+
+    async def summarize(item):
+        summary = await generate_summary_from_text(item["text"])
+        if cache is not None:
+            cache.put_summary(item["content_hash"], SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, SUMMARY_PARAMS, summary)
+        return {"pdf_url": item["pdf_url"], "summary": summary}
+
+    async def feed():
+        for pdf_url in pdf_urls:
+            await urls.put({"pdf_url": pdf_url})
+        await urls.put(_END)
+
+    tasks = [
+        asyncio.create_task(feed()),
+        asyncio.create_task(run_stage(urls, downloaded, DOWNLOAD_CONCURRENCY, download, results)),
+        asyncio.create_task(run_stage(downloaded, extracted, EXTRACT_CONCURRENCY, extract, results)),
+        asyncio.create_task(run_stage(extracted, results, SUMMARY_CONCURRENCY, summarize, results)),
+    ]
+    try:
+        while True:
+            result = await results.get()
+            if result is _END:
+                break
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.get("/cache/stats")
+def cache_stats():
+    cache = get_summary_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
 @app.get("/process-pdfs")
-def process_pdfs():
+async def process_pdfs(stream: bool = False):
+    """Summarize every PDF in PUBLICATIONS_DATA.
+
+    With stream=true the response is NDJSON, one line per PDF as soon as it
+    is done; otherwise all summaries are returned together. PDFs that fail
+    are reported under "errors" instead of aborting the whole run.
+    """
     try:
         logger.info("Starting PDF processing...")
 
         # Connect to Snowflake
-        conn = get_snowflake_connection()
+        conn = await asyncio.to_thread(get_snowflake_connection)
         
         # Fetch PDF URLs
-        pdf_urls = fetch_pdf_urls_from_snowflake(conn)
-        
-        # Process each PDF URL
-        summaries = []
-        for pdf_url in pdf_urls:
-            local_path = f"/tmp/{os.path.basename(pdf_url)}"
-            
-            # Download the PDF from GCS
-            download_pdf_from_gcs(pdf_url, local_path)
-            
-            # Extract text from the PDF
-            extracted_text = extract_text_from_pdf(local_path)
-            if not extracted_text:
-                logger.warning(f"No text found in PDF: {pdf_url}")
-                continue
-            
-            # Generate summary from extracted text
-            summary = generate_summary_from_text(extracted_text)
-            summaries.append({"pdf_url": pdf_url, "summary": summary})
-            
-            # Clean up temporary file
-            os.remove(local_path)
-            logger.info(f"Processed and removed temporary file: {local_path}")
+        pdf_urls = await asyncio.to_thread(fetch_pdf_urls_from_snowflake, conn)
+
+        if stream:
+            async def lines():
+                async for result in process_pdf_pipeline(pdf_urls):
+                    yield json.dumps(result) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        summaries, errors = [], []
+        async for result in process_pdf_pipeline(pdf_urls):
+            (errors if "error" in result else summaries).append(result)
         
-        logger.info("Successfully processed all PDFs")
-        return JSONResponse(content={"summaries": summaries})
+        logger.info(f"Processed {len(summaries)} PDFs, {len(errors)} failed")
+        return JSONResponse(content={"summaries": summaries, "errors": errors})
     
     except Exception as e:
         logger.error(f"Error processing PDFs: {str(e)}")
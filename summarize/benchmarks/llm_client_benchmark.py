@@ -0,0 +1,70 @@
+"""Compare a new OpenAI client per call with the shared pooled client.
+
+Starts mock_llm_server in-process, so no API key or network is needed.
+Run from summarize/:
+
+    python benchmarks/llm_client_benchmark.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PORT = int(os.getenv("BENCHMARK_PORT", "9123"))
+os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("NVIDIA_API_KEY", "benchmark")
+os.environ.setdefault("MOCK_LLM_LATENCY_MS", "20")
+
+import uvicorn
+from openai import OpenAI
+from llm_client import API_KEY, TRITON_SERVER_URL, get_llm_client
+from mock_llm_server import app
+
+CALLS = 200
+THREADS = 8
+MESSAGES = [{"role": "user", "content": "Summarize the following text in a concise way: \nbenchmark"}]
+
+
+def call(client):
+    return client.chat.completions.create(
+        model="meta/llama-3.1-405b-instruct",
+        messages=MESSAGES,
+        max_tokens=20
+    ).choices[0].message.content
+
+
+def per_call_client(_):
+    """What generate_summary_from_text used to do: a fresh client and pool per call"""
+    return call(OpenAI(base_url=TRITON_SERVER_URL, api_key=API_KEY))
+
+
+def shared_client(_):
+    return call(get_llm_client())
+
+
+def timed(label, fn, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fn, range(CALLS)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} threads={threads:<3} {elapsed:7.2f}s  {CALLS / elapsed:8.1f} calls/s")
+
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    server = start_server()
+    for threads in (1, THREADS):
+        timed("new client per call", per_call_client, threads)
+        timed("shared pooled client", shared_client, threads)
+    server.should_exit = True
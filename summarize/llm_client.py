@@ -0,0 +1,56 @@
+import importlib.util
+import os
+from functools import lru_cache
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+
+# Load environment variables from .env file
+load_dotenv()
+
+# NVIDIA API configurations; point LLM_BASE_URL at mock_llm_server.py for benchmarks
+API_KEY = os.getenv("NVIDIA_API_KEY")
+TRITON_SERVER_URL = os.getenv("LLM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+
+# Summary request; the summary cache keys on all three, so keep them here
+SUMMARY_MODEL = "meta/llama-3.1-405b-instruct"
+SUMMARY_PROMPT_TEMPLATE = "Summarize the following text in a concise way: \n{text}"
+SUMMARY_PARAMS = {"temperature": 0.2, "top_p": 0.7, "max_tokens": 150}
+
+# Connection pool shared by every request in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_SUPPORT = importlib.util.find_spec("h2") is not None
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true" and HTTP2_SUPPORT
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+
+@lru_cache()
+def get_llm_client():
+    """Process-wide OpenAI client, so connections and TLS sessions are reused across calls."""
+    return OpenAI(
+        base_url=TRITON_SERVER_URL,
+        api_key=API_KEY,
+        http_client=httpx.Client(http2=LLM_HTTP2, limits=_limits(), timeout=LLM_TIMEOUT)
+    )
+
+
+@lru_cache()
+def get_async_llm_client():
+    """Async counterpart of get_llm_client for code running on the event loop."""
+    return AsyncOpenAI(
+        base_url=TRITON_SERVER_URL,
+        api_key=API_KEY,
+        http_client=httpx.AsyncClient(http2=LLM_HTTP2, limits=_limits(), timeout=LLM_TIMEOUT)
+    )
@@ -0,0 +1,76 @@
+"""Minimal OpenAI-compatible chat completions server for local benchmarks.
+
+Run it and point the summarize service (or the backend) at it:
+
+    uvicorn mock_llm_server:app --port 9000
+    export LLM_BASE_URL=http://localhost:9000/v1
+
+MOCK_LLM_LATENCY_MS sets the delay before the first token and
+MOCK_LLM_TOKENS how many tokens each completion returns.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "50"))
+MOCK_LLM_TOKENS = int(os.getenv("MOCK_LLM_TOKENS", "20"))
+
+app = FastAPI()
+
+@app.get("/v1/models")
+def list_models():
+    return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+    tokens = [f"token{i} " for i in range(min(MOCK_LLM_TOKENS, body.get("max_tokens") or MOCK_LLM_TOKENS))]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    await asyncio.sleep(MOCK_LLM_LATENCY_MS / 1000.0)
+
+    if body.get("stream"):
+        async def events():
+            for token in tokens:
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return JSONResponse(content={
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+    })
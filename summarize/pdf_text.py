@@ -0,0 +1,74 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import fitz  # PyMuPDF
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Documents with at least this many pages are split into page ranges across processes
+PARALLEL_EXTRACT_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACT_MIN_PAGES", "64"))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+# Where a long document is written once for the workers to open; tmpfs keeps it in RAM
+EXTRACT_SPOOL_DIR = os.getenv("EXTRACT_SPOOL_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else "") or None
+
+_extract_pool = None
+
+
+def open_pdf(source):
+    """Open a PDF from bytes (or a buffer) in memory, or from a path."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    if hasattr(source, "read"):
+        return fitz.open(stream=source.read(), filetype="pdf")
+    return fitz.open(source)
+
+
+def iter_page_text(doc, start=0, stop=None):
+    """Text of pages [start, stop) one page at a time."""
+    for number in range(start, doc.page_count if stop is None else min(stop, doc.page_count)):
+        yield doc.load_page(number).get_text("text")
+
+
+def extract_page_range(source, start, stop):
+    """Text of pages [start, stop); module level so worker processes can run it."""
+    with open_pdf(source) as doc:
+        return "".join(iter_page_text(doc, start, stop))
+
+
+def extract_text(source):
+    """Whole-document text, joined once instead of grown with +=."""
+    with open_pdf(source) as doc:
+        return "".join(iter_page_text(doc)).strip()
+
+
+def _get_extract_pool():
+    global _extract_pool
+    if _extract_pool is None:
+        _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _extract_pool
+
+
+def extract_text_parallel(pdf_bytes):
+    """Extract long documents as page ranges in worker processes, short ones inline.
+
+    Workers get the path of one spooled copy and their page range rather
+    than the bytes, which would be pickled into every task (one full copy
+    per worker); each worker only reads the pages it extracts.
+    """
+    with open_pdf(pdf_bytes) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_EXTRACT_MIN_PAGES or EXTRACT_WORKERS < 2:
+            return "".join(iter_page_text(doc)).strip()
+
+    step = -(-page_count // EXTRACT_WORKERS)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=EXTRACT_SPOOL_DIR, delete=False) as spool:
+        spool.write(pdf_bytes)
+    try:
+        pool = _get_extract_pool()
+        futures = [pool.submit(extract_page_range, spool.name, start, stop) for start, stop in ranges]
+        return "".join(future.result() for future in futures).strip()
+    finally:
+        os.remove(spool.name)
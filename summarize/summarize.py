@@ -1,27 +1,20 @@
-import fitz  # PyMuPDF
 import os
 import requests
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_client import API_KEY, TRITON_SERVER_URL, SUMMARY_MODEL, SUMMARY_PARAMS, SUMMARY_PROMPT_TEMPLATE, get_llm_client
+from pdf_text import extract_text
 
 # Load environment variables from .env file
 load_dotenv()
 
-# NVIDIA API configurations
-API_KEY = os.getenv("NVIDIA_API_KEY")
-TRITON_SERVER_URL = "https://integrate.api.nvidia.com/v1"
-
+# NVIDIA API configurations come from llm_client
 if not API_KEY or not TRITON_SERVER_URL:
     raise EnvironmentError("NVIDIA API_KEY or TRITON_SERVER_URL not found in environment variables")
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file using PyMuPDF."""
+def extract_text_from_pdf(pdf_source):
+    """Extract text from a PDF path or in-memory bytes using PyMuPDF."""
     try:
-        with fitz.open(pdf_path) as doc:
-            text = ""
-            for page in doc:
-                text += page.get_text("text")
-        return text.strip()
+        return extract_text(pdf_source)
     except Exception as e:
         print(f"Error extracting text from PDF: {str(e)}")
         return None
@@ -29,25 +22,20 @@ def extract_text_from_pdf(pdf_path):
 def generate_summary_from_text(extracted_text):
     """Generate a summary using the NVIDIA model."""
     try:
-        # Create OpenAI client
-        openai_client = OpenAI(
-            base_url=TRITON_SERVER_URL,
-            api_key=API_KEY
-        )
+        # Shared client: connections are pooled across calls
+        openai_client = get_llm_client()
 
         # Prepare prompt message
         prompt_message = [{
             'role': 'user',
-            'content': f"Summarize the following text in a concise way: \n{extracted_text}"
+            'content': SUMMARY_PROMPT_TEMPLATE.format(text=extracted_text)
         }]
 
         # Make completion request
         completion_response = openai_client.chat.completions.create(
-            model="meta/llama-3.1-405b-instruct",
+            model=SUMMARY_MODEL,
             messages=prompt_message,
-            temperature=0.2,
-            top_p=0.7,
-            max_tokens=150,
+            **SUMMARY_PARAMS,
             stream=True
         )
 
@@ -96,13 +84,16 @@ if __name__ == "__main__":
 
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import fitz  # PyMuPDF
+from fastapi.concurrency import run_in_threadpool
+import json
 import os
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_client import API_KEY, TRITON_SERVER_URL, SUMMARY_MODEL, SUMMARY_PARAMS, SUMMARY_PROMPT_TEMPLATE, get_async_llm_client, get_llm_client
+from pdf_text import extract_text_parallel, iter_page_text, open_pdf
+from summary_cache import get_summary_cache, pdf_hash
 
 # Load environment variables from .env file
 load_dotenv()
@@ -119,56 +110,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# NVIDIA API configurations
-API_KEY = os.getenv("NVIDIA_API_KEY")
-TRITON_SERVER_URL = "https://integrate.api.nvidia.com/v1"
-
+# NVIDIA API configurations come from llm_client
 if not API_KEY or not TRITON_SERVER_URL:
     raise EnvironmentError("NVIDIA API_KEY or TRITON_SERVER_URL not found in environment variables")
 
 class SummarizeResponse(BaseModel):
     summary: str
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file using PyMuPDF."""
+def extract_text_from_pdf(pdf_bytes):
+    """Extract text from in-memory PDF bytes; long documents are split across worker processes."""
     try:
-        with fitz.open(pdf_path) as doc:
-            text = ""
-            for page in doc:
-                text += page.get_text("text")
-        return text.strip()
+        return extract_text_parallel(pdf_bytes)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {str(e)}")
 
-def generate_summary_from_text(extracted_text):
-    """Generate a summary using the NVIDIA model."""
+async def generate_summary_from_text(extracted_text):
+    """Generate a summary using the NVIDIA model, awaited on the event loop."""
     try:
-        # Create OpenAI client
-        openai_client = OpenAI(
-            base_url=TRITON_SERVER_URL,
-            api_key=API_KEY
-        )
+        # Shared async client: connections are pooled across requests
+        openai_client = get_async_llm_client()
 
         # Prepare prompt message
         prompt_message = [{
             'role': 'user',
-            'content': f"Summarize the following text in a concise way: \n{extracted_text}"
+            'content': SUMMARY_PROMPT_TEMPLATE.format(text=extracted_text)
         }]
 
         # Make completion request
-        completion_response = openai_client.chat.completions.create(
-            model="meta/llama-3.1-405b-instruct",
+        completion_response = await openai_client.chat.completions.create(
+            model=SUMMARY_MODEL,
             messages=prompt_message,
-            temperature=0.2,
-            top_p=0.7,
-            max_tokens=150,
+            **SUMMARY_PARAMS,
             stream=True
         )
 
         # Collect the generated summary
         summary_text = ""
-        for chunk in completion_response:
-            if chunk.choices[0].delta.content is not None:
+        async for chunk in completion_response:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
                 summary_text += chunk.choices[0].delta.content
 
         return summary_text
@@ -181,30 +160,111 @@ async def summarize_pdf(file: UploadFile = File(...)):
     if not file:
         raise HTTPException(status_code=400, detail="No file received")
 
-    # Save the uploaded PDF to a temporary location
-    pdf_path = f"/tmp/{file.filename}"
     try:
-        with open(pdf_path, "wb") as pdf_file:
-            pdf_file.write(await file.read())
-
-        # Extract text from the PDF
-        extracted_text = extract_text_from_pdf(pdf_path)
+        pdf_bytes = await file.read()
+
+        # Identical uploads skip extraction and the model entirely
+        cache = get_summary_cache()
+        content_hash = pdf_hash(pdf_bytes)
+        if cache is not None:
+            summary = cache.get_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, SUMMARY_PARAMS)
+            if summary:
+                return JSONResponse(content={"summary": summary})
+
+        extracted_text = cache.get_text(content_hash) if cache is not None else None
+        if extracted_text is None:
+            # Extract straight from the upload's bytes, off the event loop
+            extracted_text = await run_in_threadpool(extract_text_from_pdf, pdf_bytes)
+            if cache is not None:
+                cache.put_text(content_hash, extracted_text)
         if not extracted_text:
             raise HTTPException(status_code=400, detail="No text found in PDF")
 
         # Generate summary from extracted text
-        summary = generate_summary_from_text(extracted_text)
+        summary = await generate_summary_from_text(extracted_text)
         if summary:
+            if cache is not None:
+                cache.put_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, SUMMARY_PARAMS, summary)
             return JSONResponse(content={"summary": summary})
         else:
             raise HTTPException(status_code=500, detail="Failed to generate summary")
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
-    
-    finally:
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def summary_events(pdf_bytes):
+    """Yield SSE events: one 'progress' per extracted page, then 'token's as the model emits them.
+
+    A sync generator, so StreamingResponse runs it in the threadpool and the
+    blocking fitz and OpenAI calls never stall the event loop.
+    """
+    try:
+        cache = get_summary_cache()
+        content_hash = pdf_hash(pdf_bytes)
+        if cache is not None:
+            summary = cache.get_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, SUMMARY_PARAMS)
+            if summary:
+                yield sse_event("done", {"summary": summary, "cached": True})
+                return
+
+        extracted_text = cache.get_text(content_hash) if cache is not None else None
+        if extracted_text is None:
+            pages = []
+            with open_pdf(pdf_bytes) as doc:
+                for number, page_text in enumerate(iter_page_text(doc), 1):
+                    pages.append(page_text)
+                    yield sse_event("progress", {"page": number, "pages": doc.page_count})
+            extracted_text = "".join(pages).strip()
+            if cache is not None:
+                cache.put_text(content_hash, extracted_text)
+        if not extracted_text:
+            yield sse_event("error", {"detail": "No text found in PDF"})
+            return
+
+        openai_client = get_llm_client()
+        completion_response = openai_client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[{
+                'role': 'user',
+                'content': SUMMARY_PROMPT_TEMPLATE.format(text=extracted_text)
+            }],
+            **SUMMARY_PARAMS,
+            stream=True
+        )
+
+        summary_parts = []
+        for chunk in completion_response:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                summary_parts.append(chunk.choices[0].delta.content)
+                yield sse_event("token", {"text": chunk.choices[0].delta.content})
+        summary = "".join(summary_parts)
+        if cache is not None:
+            cache.put_summary(content_hash, SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, SUMMARY_PARAMS, summary)
+        yield sse_event("done", {"summary": summary, "cached": False})
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Error processing PDF: {str(e)}"})
+
+# Streaming variant: page progress and summary tokens as server-sent events
+@app.post("/summarize/stream")
+async def summarize_pdf_stream(file: UploadFile = File(...)):
+    if not file:
+        raise HTTPException(status_code=400, detail="No file received")
+
+    pdf_bytes = await file.read()
+    return StreamingResponse(
+        summary_events(pdf_bytes),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/cache/stats")
+def cache_stats():
+    cache = get_summary_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
 
 # Root route for basic check
 @app.get("/")
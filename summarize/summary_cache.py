@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# SQLite file shared by every worker; set to an empty string to disable caching
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "./data/summary_cache.sqlite3")
+
+
+def pdf_hash(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def summary_key(content_hash, model, prompt_template, params):
+    """Key for a summary: the PDF plus everything that shapes the model's output."""
+    payload = json.dumps([content_hash, model, prompt_template, params], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """Extracted text and summaries, keyed by the sha256 of the PDF bytes.
+
+    Text depends only on the PDF, so it is stored per content hash and a new
+    prompt or model still skips extraction. Summaries are stored per
+    summary_key(), which adds the model, prompt template and generation
+    parameters.
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts (content_hash TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, summary TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.text_hits = 0
+        self.text_misses = 0
+        self.summary_hits = 0
+        self.summary_misses = 0
+
+    def get_text(self, content_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM texts WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row:
+                self.text_hits += 1
+            else:
+                self.text_misses += 1
+        return row[0] if row else None
+
+    def put_text(self, content_hash, text):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts (content_hash, text) VALUES (?, ?)",
+                (content_hash, text)
+            )
+            self._conn.commit()
+
+    def get_summary(self, content_hash, model, prompt_template, params):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE key = ?",
+                (summary_key(content_hash, model, prompt_template, params),)
+            ).fetchone()
+            if row:
+                self.summary_hits += 1
+            else:
+                self.summary_misses += 1
+        return row[0] if row else None
+
+    def put_summary(self, content_hash, model, prompt_template, params, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, content_hash, summary) VALUES (?, ?, ?)",
+                (summary_key(content_hash, model, prompt_template, params), content_hash, summary)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        text_lookups = self.text_hits + self.text_misses
+        summary_lookups = self.summary_hits + self.summary_misses
+        return {
+            "text_hits": self.text_hits,
+            "text_misses": self.text_misses,
+            "text_hit_rate": self.text_hits / text_lookups if text_lookups else 0.0,
+            "summary_hits": self.summary_hits,
+            "summary_misses": self.summary_misses,
+            "summary_hit_rate": self.summary_hits / summary_lookups if summary_lookups else 0.0
+        }
+
+
+@lru_cache()
+def get_summary_cache():
+    """Process-wide cache, or None when SUMMARY_CACHE_PATH is empty."""
+    if not SUMMARY_CACHE_PATH:
+        return None
+    return SummaryCache(SUMMARY_CACHE_PATH)